@@ -8,15 +8,41 @@ description: |
 author: SEOPROOF
 author_url: https://seoproof.org
 original_git_url: https://github.com/seoproof/openwebui
-version: 0.0.3
+version: 0.0.25
 license: MIT
 """
 
+import io
+import os
+import math
 import re
+import csv
+import sys
+import time
+import heapq
+import random
 import asyncio
-import requests
+import hashlib
+import sqlite3
+import aiohttp
+import tracemalloc
+import numpy as np
+from array import array
+from collections import OrderedDict
+from itertools import chain, repeat
+from email.utils import parsedate_to_datetime
 from pydantic import BaseModel, Field
-from typing import Callable, Any, Optional
+from typing import (
+    Callable,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 import json
 
 
@@ -48,6 +74,1047 @@ class SEOZoomValves(BaseModel):
     )
 
 
+class SEOZoomTransport:
+    def __init__(self):
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.settings: Optional[tuple] = None
+
+    async def get_session(self, valves) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        settings = (
+            valves.SEOZOOM_MAX_CONNECTIONS,
+            valves.SEOZOOM_MAX_CONNECTIONS_PER_HOST,
+            valves.SEOZOOM_KEEPALIVE_TIMEOUT,
+            valves.SEOZOOM_CONNECT_TIMEOUT,
+            valves.SEOZOOM_TIMEOUT,
+        )
+        if (
+            self.session is not None
+            and not self.session.closed
+            and self.loop is loop
+            and self.settings == settings
+        ):
+            return self.session
+        stale = self.session if self.loop is loop else None
+        connector = aiohttp.TCPConnector(
+            limit=valves.SEOZOOM_MAX_CONNECTIONS,
+            limit_per_host=valves.SEOZOOM_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=valves.SEOZOOM_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=valves.SEOZOOM_TIMEOUT,
+            connect=valves.SEOZOOM_CONNECT_TIMEOUT,
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self.loop = loop
+        self.settings = settings
+        if stale is not None and not stale.closed:
+            await stale.close()
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str, ttl: float):
+        size = len(value.encode("utf-8"))
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        self.remove(key)
+        self.entries[key] = (value, size, time.monotonic() + ttl)
+        self.size += size
+        self.evict()
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def evict(self):
+        while self.entries and (
+            len(self.entries) > self.max_entries or self.size > self.max_bytes
+        ):
+            _, (_, size, _) = self.entries.popitem(last=False)
+            self.size -= size
+
+    def stats(self) -> str:
+        return f"cache hits: {self.hits}, misses: {self.misses}"
+
+
+class PersistentCache:
+    FILENAME = "seozoom_history.sqlite3"
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.ready = False
+
+    def configure(self, directory: str):
+        path = os.path.join(directory, self.FILENAME) if directory else None
+        if path != self.path:
+            self.path = path
+            self.ready = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def connect(self) -> sqlite3.Connection:
+        if not self.ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self.ready:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            connection.commit()
+            self.ready = True
+        return connection
+
+    def get(self, key: str) -> Optional[str]:
+        connection = self.connect()
+        try:
+            row = connection.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR IGNORE INTO responses (key, value, created_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, value, time.time()),
+                )
+        finally:
+            connection.close()
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls: Dict[str, asyncio.Task] = {}
+
+    async def do(
+        self, key: str, factory: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        task = self.calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def forget(self, key: str, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            task.exception()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    async def acquire(self, api_key: str, rate: float, burst: int) -> float:
+        if rate <= 0:
+            return 0.0
+        name = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        bucket = self.buckets.get(name)
+        if bucket is None or bucket.rate != rate or bucket.burst != burst:
+            bucket = self.buckets[name] = TokenBucket(rate, burst)
+        delay = bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+JSON_CLOSERS = {"{": "}", "[": "]"}
+MALFORMED_JSON = "Malformed JSON response from SEOZoom API"
+
+
+def payload_error(text: str) -> Optional[str]:
+    stripped = text.strip()
+    if not stripped.startswith(("{", "[")):
+        return "Unexpected non-JSON response from SEOZoom API"
+    if stripped[-1] != JSON_CLOSERS[stripped[0]]:
+        return "Truncated JSON response from SEOZoom API"
+    if stripped[0] == "{" and '"error"' in stripped:
+        try:
+            data = json.loads(stripped)
+        except ValueError:
+            return MALFORMED_JSON
+        if isinstance(data, dict) and data.get("error"):
+            return str(data["error"])
+    return None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+CASE_INSENSITIVE_PARAMS = {"db", "keyword", "domain"}
+HISTORY_ACTIONS = {"serphistory", "metricshistory"}
+
+
+def key_fingerprint(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(endpoint: str, action: str, params: dict, api_key: str) -> str:
+    normalized = {}
+    for name, value in params.items():
+        if name in ("api_key", "action") or value is None:
+            continue
+        value = str(value).strip()
+        if name in CASE_INSENSITIVE_PARAMS:
+            value = value.lower()
+        normalized[name] = value
+    key = [endpoint, action, normalized]
+    if endpoint == "projects":
+        key.append(key_fingerprint(api_key))
+    return json.dumps(key, sort_keys=True, ensure_ascii=False)
+
+
+def is_immutable(action: str, params: dict) -> bool:
+    return action in HISTORY_ACTIONS and bool(params.get("date"))
+
+
+def cache_ttl(endpoint: str, action: str, params: dict, valves) -> float:
+    if is_immutable(action, params):
+        return valves.SEOZOOM_CACHE_HISTORY_TTL
+    if endpoint == "projects" or action == "serp":
+        return valves.SEOZOOM_CACHE_SHORT_TTL
+    return valves.SEOZOOM_CACHE_TTL
+
+
+class SEOZoomError(Exception):
+    pass
+
+
+ROW_CONTAINER_KEYS = ("data", "results", "keywords", "items", "rows")
+
+
+def find_rows(data: Any) -> Tuple[Optional[list], Optional[str]]:
+    if isinstance(data, list):
+        return data, None
+    if isinstance(data, dict):
+        for name in ROW_CONTAINER_KEYS:
+            if isinstance(data.get(name), list):
+                return data[name], name
+        for name, value in data.items():
+            if value and isinstance(value, list) and isinstance(value[0], dict):
+                return value, name
+    return None, None
+
+
+def extract_rows(data: Any) -> List[Any]:
+    rows, _ = find_rows(data)
+    return rows if rows is not None else []
+
+
+DOMAIN_FIELDS = ("domain", "competitor", "competitor_domain", "site", "host", "url")
+OVERLAP_FIELDS = (
+    "common_keywords",
+    "keywords_in_common",
+    "shared_keywords",
+    "common",
+    "overlap",
+    "score",
+)
+
+
+def field_name(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def pick_field(row: Any, candidates: Tuple[str, ...]) -> Any:
+    if not isinstance(row, dict):
+        return None
+    fields = {field_name(str(k)): v for k, v in row.items()}
+    for candidate in candidates:
+        value = fields.get(field_name(candidate))
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", "").replace("%", "").strip())
+        except ValueError:
+            return None
+    return None
+
+
+def normalize_domain(value: Any) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    domain = re.sub(r"^[a-z][a-z0-9+.-]*://", "", value.strip().lower())
+    domain = domain.split("/", 1)[0].split(":", 1)[0].rstrip(".")
+    if domain.startswith("www."):
+        domain = domain[4:]
+    return domain if "." in domain else None
+
+
+KEYWORD_FIELDS = ("keyword", "kw", "related_keyword", "query", "term")
+VOLUME_FIELDS = ("search_volume", "volume", "avg_monthly_searches", "searches", "sv")
+
+
+def normalize_keyword(value: Any) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    keyword = " ".join(value.lower().split())
+    return keyword or None
+
+
+OUTPUT_FORMATS = ("json", "csv", "tsv", "markdown")
+
+
+def project_row(row: Any, fields: Optional[List[str]]) -> Any:
+    if fields and isinstance(row, dict):
+        return {name: row.get(name) for name in fields}
+    return row
+
+
+def cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return str(value)
+
+
+def table_lines(rows: List[dict], columns: List[str], output_format: str):
+    if output_format == "markdown":
+
+        def line(values):
+            escaped = (cell(v).replace("|", "\\|").replace("\n", " ") for v in values)
+            return "| " + " | ".join(escaped) + " |"
+
+        header = [line(columns), "|" + "---|" * len(columns)]
+        return header, (line(row.get(c) for c in columns) for row in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(
+        buffer, delimiter="\t" if output_format == "tsv" else ",", lineterminator=""
+    )
+
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([cell(v) for v in values])
+        return buffer.getvalue()
+
+    return [line(columns)], (line(row.get(c) for c in columns) for row in rows)
+
+
+def format_payload(
+    text: str,
+    fields: Optional[List[str]] = None,
+    output_format: str = "json",
+    max_rows: Optional[int] = None,
+    max_bytes: int = 0,
+) -> str:
+    if (
+        not fields
+        and output_format == "json"
+        and not max_rows
+        and (not max_bytes or len(text) <= max_bytes)
+    ):
+        return text
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return json.dumps({"error": MALFORMED_JSON})
+    rows, name = find_rows(data)
+    if rows is None:
+        if not isinstance(data, dict):
+            return text
+        rows, name = [data], None
+        data = None
+    total = len(rows)
+    rows = [project_row(row, fields) for row in rows[: max_rows or None]]
+    reason = "row limit" if len(rows) < total else None
+    if output_format == "json":
+        header = []
+        lines = (
+            json.dumps(row, ensure_ascii=False, separators=(",", ":")) for row in rows
+        )
+    else:
+        rows = [row if isinstance(row, dict) else {"value": row} for row in rows]
+        columns = list(fields or [])
+        if not columns:
+            for row in rows:
+                columns.extend(k for k in row if k not in columns)
+        header, lines = table_lines(rows, columns or ["value"], output_format)
+    budget = max_bytes - sum(len(line.encode("utf-8")) + 1 for line in header)
+    encoded = []
+    for line in lines:
+        if max_bytes:
+            budget -= len(line.encode("utf-8")) + 1
+            if budget < 0:
+                reason = "byte budget"
+                break
+        encoded.append(line)
+    kept = len(encoded)
+    truncated = None
+    if reason is not None:
+        truncated = {
+            "rows_returned": kept,
+            "rows_total": total,
+            "rows_omitted": total - kept,
+            "reason": reason,
+        }
+    if output_format != "json":
+        if truncated is not None:
+            encoded.append(
+                f"# truncated: {kept} of {total} rows returned, "
+                f"{total - kept} omitted ({reason})"
+            )
+        return "\n".join(header + encoded)
+    if data is None:
+        body = encoded[0] if encoded else "{}"
+    else:
+        body = "[" + ",".join(encoded) + "]"
+        if name is not None:
+            rest = {k: v for k, v in data.items() if k != name}
+            meta = json.dumps(rest, ensure_ascii=False, separators=(",", ":"))
+            body = meta[:-1] + ("," if rest else "") + json.dumps(name) + ":" + body
+            body += "}"
+    if truncated is None:
+        return body
+    return json.dumps(
+        {"results": json.loads(body), "truncated": truncated},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+async def bulk_fetch(
+    tools: "Tools",
+    endpoint: str,
+    action: str,
+    item_param: str,
+    items: List[str],
+    params: dict,
+    on_result: Callable[[int, str, Any], Awaitable[None]],
+    __user__: dict = {},
+):
+    pending = iter(enumerate(items))
+
+    async def worker():
+        for index, item in pending:
+            try:
+                data = json.loads(
+                    await tools.seozoom_request(
+                        endpoint,
+                        action,
+                        {**params, item_param: item},
+                        None,
+                        __user__,
+                        raw=True,
+                    )
+                )
+            except Exception as e:
+                data = {"error": str(e)}
+            await on_result(index, item, data)
+
+    workers = min(tools.valves.SEOZOOM_BULK_CONCURRENCY, len(items))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+
+async def iter_domain_keywords(
+    tools: "Tools",
+    domain: str,
+    db: str = "it",
+    type: str = "up",
+    page_size: int = 100,
+    max_rows: Optional[int] = None,
+    predicate: Optional[Callable[[dict], bool]] = None,
+    __user__: dict = {},
+) -> AsyncIterator[dict]:
+    def fetch(offset: int) -> asyncio.Task:
+        return asyncio.ensure_future(
+            tools.seozoom_request(
+                "domains",
+                "keywords",
+                {
+                    "db": db,
+                    "domain": domain,
+                    "type": type,
+                    "offset": offset,
+                    "limit": page_size,
+                },
+                None,
+                __user__,
+                raw=True,
+            )
+        )
+
+    offset = 0
+    count = 0
+    task = fetch(offset)
+    try:
+        while task is not None:
+            data = json.loads(await task)
+            if isinstance(data, dict) and "error" in data:
+                raise SEOZoomError(data["error"])
+            rows = extract_rows(data)
+            del data
+            offset += page_size
+            task = fetch(offset) if len(rows) >= page_size else None
+            for row in rows:
+                if predicate is not None and not predicate(row):
+                    continue
+                yield row
+                count += 1
+                if max_rows is not None and count >= max_rows:
+                    return
+    finally:
+        if task is not None and not task.done():
+            task.cancel()
+
+
+MISSING = {"d": float("nan"), "i": -1}
+TABLE_OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+FILTER_PATTERN = re.compile(r"^\s*(.+?)\s*(<=|>=|==|!=|<|>|=|~)\s*(.*?)\s*$")
+TABLE_AGGREGATES = ("sum", "mean", "min", "max", "count")
+
+
+TABLE_CHUNK_ROWS = 4096
+NUMERIC_TYPES = frozenset({int, float, type(None)})
+SCALAR_TYPES = frozenset({str, int, float, type(None)})
+TEXT_TYPES = frozenset({str, type(None)})
+
+
+class KeywordTableBuilder:
+    def __init__(self):
+        self.count = 0
+        self.filled = 0
+        self.pending: List[dict] = []
+        self.order: List[str] = []
+        self.columns: Dict[str, array] = {}
+        self.index: Dict[str, Dict[str, int]] = {}
+
+    def append(self, row: dict):
+        self.pending.append(row)
+        self.count += 1
+        if len(self.pending) >= TABLE_CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        # Rows are converted a chunk at a time, column by column, so clean
+        # numeric and text columns avoid the per-cell type checks below.
+        rows, self.pending = self.pending, []
+        known = len(self.order)
+        first = {}
+        for name in dict.fromkeys(chain.from_iterable(rows)):
+            if name not in self.columns:
+                first[name] = next(
+                    (
+                        (i, list(row).index(name))
+                        for i, row in enumerate(rows)
+                        if not isinstance(row.get(name, []), (dict, list))
+                    ),
+                    None,
+                )
+                if first[name] is None:
+                    continue
+            self.extend(name, list(map(dict.get, rows, repeat(name))))
+        self.order[known:] = sorted(self.order[known:], key=first.get)
+        self.filled += len(rows)
+        for column in self.columns.values():
+            if len(column) < self.filled:
+                missing = MISSING[column.typecode]
+                column.extend([missing] * (self.filled - len(column)))
+
+    def extend(self, name: str, values: list):
+        column = self.columns.get(name)
+        types = set(map(type, values))
+        if (column is None or column.typecode == "d") and types <= NUMERIC_TYPES:
+            if column is None:
+                column = self.add_column(name, "d")
+            column.frombytes(np.array(values, dtype=np.float64).tobytes())
+            return
+        for position, value in enumerate(values):
+            if column is not None and column.typecode == "i" and types <= SCALAR_TYPES:
+                keys = values[position:]
+                if not types <= TEXT_TYPES:
+                    keys = [None if v is None else str(v) for v in keys]
+                index = self.index[name]
+                for key in dict.fromkeys(keys):
+                    if key is not None:
+                        index.setdefault(key, len(index))
+                column.extend(map(index.get, keys, repeat(-1)))
+                return
+            column = self.append_value(name, column, value)
+
+    def append_value(self, name: str, column: Optional[array], value: Any) -> array:
+        if isinstance(value, (dict, list)):
+            value = None
+        if column is not None and column.typecode == "i":
+            index = self.index[name]
+            column.append(
+                -1 if value is None else index.setdefault(str(value), len(index))
+            )
+            return column
+        missing = value is None or value == ""
+        number = None if missing else numeric_value(value)
+        if column is None:
+            column = self.add_column(
+                name, "d" if missing or number is not None else "i"
+            )
+        if column.typecode == "d":
+            if missing:
+                column.append(MISSING["d"])
+                return column
+            if number is not None:
+                column.append(number)
+                return column
+            column = self.to_text(name)
+        index = self.index[name]
+        column.append(index.setdefault(str(value), len(index)))
+        return column
+
+    def add_column(self, name: str, typecode: str) -> array:
+        column = self.columns[name] = array(typecode, [MISSING[typecode]] * self.filled)
+        if typecode == "i":
+            self.index[name] = {}
+        self.order.append(name)
+        return column
+
+    def to_text(self, name: str) -> array:
+        index = self.index[name] = {}
+        column = array("i")
+        for value in self.columns[name]:
+            if value != value:
+                column.append(-1)
+            else:
+                text = str(int(value)) if value.is_integer() else str(value)
+                column.append(index.setdefault(text, len(index)))
+        self.columns[name] = column
+        return column
+
+    def build(self) -> "KeywordTable":
+        self.flush()
+        columns = {}
+        for name in self.order:
+            column = self.columns[name]
+            dtype = np.float64 if column.typecode == "d" else np.intc
+            columns[name] = np.frombuffer(column, dtype=dtype)
+        vocabs = {
+            name: np.array(list(index), dtype=object)
+            for name, index in self.index.items()
+        }
+        return KeywordTable(columns, vocabs, self.index, self.count)
+
+
+def numeric_value(value: Any) -> Optional[float]:
+    number = to_number(value)
+    if number is None or (isinstance(value, str) and not math.isfinite(number)):
+        return None
+    return number
+
+
+class KeywordTable:
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        vocabs: Dict[str, np.ndarray],
+        index: Dict[str, Dict[str, int]],
+        length: int,
+    ):
+        self.columns = columns
+        self.vocabs = vocabs
+        self.index = index
+        self.length = length
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "KeywordTable":
+        builder = KeywordTableBuilder()
+        for row in rows:
+            builder.append(row)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values()) + sum(
+            sys.getsizeof(text) for vocab in self.vocabs.values() for text in vocab
+        )
+
+    def resolve(self, name: str) -> str:
+        if name in self.columns:
+            return name
+        wanted = field_name(name)
+        for column in self.columns:
+            if field_name(column) == wanted:
+                return column
+        raise ValueError(
+            f"Unknown column: {name} (available: {', '.join(self.columns)})"
+        )
+
+    def is_text(self, name: str) -> bool:
+        return name in self.vocabs
+
+    def mask(self, name: str, op: str, value: str) -> np.ndarray:
+        name = self.resolve(name)
+        column = self.columns[name]
+        op = "==" if op == "=" else op
+        if not self.is_text(name):
+            if op not in TABLE_OPERATORS:
+                raise ValueError(f"Operator {op} is not supported for {name}")
+            number = to_number(value)
+            if number is None:
+                raise ValueError(f"Expected a number for {name}, got {value!r}")
+            return TABLE_OPERATORS[op](column, number)
+        if op == "~":
+            needle = value.lower()
+            matches = np.fromiter(
+                (needle in text.lower() for text in self.vocabs[name]),
+                dtype=bool,
+                count=len(self.vocabs[name]),
+            )
+            return (column >= 0) & matches[column]
+        if op not in ("==", "!="):
+            raise ValueError(f"Operator {op} is not supported for {name}")
+        code = self.index[name].get(value, -2)
+        return column == code if op == "==" else column != code
+
+    def where(self, conditions: List[Tuple[str, str, str]]) -> "KeywordTable":
+        mask = np.ones(self.length, dtype=bool)
+        for name, op, value in conditions:
+            mask &= self.mask(name, op, value)
+        return self.take(mask)
+
+    def take(self, selection: np.ndarray) -> "KeywordTable":
+        columns = {name: column[selection] for name, column in self.columns.items()}
+        length = len(next(iter(columns.values()))) if columns else 0
+        return KeywordTable(columns, self.vocabs, self.index, length)
+
+    def group_by(
+        self, key: str, value: Optional[str] = None, aggregate: str = "sum"
+    ) -> "KeywordTable":
+        if aggregate not in TABLE_AGGREGATES:
+            raise ValueError(
+                f"Unsupported aggregate: {aggregate} "
+                f"(available: {', '.join(TABLE_AGGREGATES)})"
+            )
+        key = self.resolve(key)
+        keys, inverse = np.unique(self.columns[key], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys)).astype(np.float64)
+        columns = {key: keys, "count": counts}
+        if value is not None and aggregate != "count":
+            value = self.resolve(value)
+            if self.is_text(value):
+                raise ValueError(f"Cannot aggregate text column {value}")
+            values = self.columns[value]
+            present = ~np.isnan(values)
+            if aggregate in ("sum", "mean"):
+                totals = np.bincount(
+                    inverse, weights=np.where(present, values, 0), minlength=len(keys)
+                )
+                if aggregate == "mean":
+                    seen = np.bincount(inverse, weights=present, minlength=len(keys))
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        totals = totals / seen
+            else:
+                ufunc = np.minimum if aggregate == "min" else np.maximum
+                start = np.inf if aggregate == "min" else -np.inf
+                totals = np.full(len(keys), start)
+                ufunc.at(totals, inverse[present], values[present])
+                totals[np.isinf(totals)] = np.nan
+            columns[f"{value}_{aggregate}"] = totals
+        vocabs = {key: self.vocabs[key]} if self.is_text(key) else {}
+        index = {key: self.index[key]} if self.is_text(key) else {}
+        return KeywordTable(columns, vocabs, index, len(keys))
+
+    def top_k(self, name: str, k: int, descending: bool = True) -> "KeywordTable":
+        name = self.resolve(name)
+        column = self.columns[name]
+        if self.is_text(name):
+            raise ValueError(f"Cannot rank by text column {name}")
+        fill = -np.inf if descending else np.inf
+        scores = np.where(np.isnan(column), fill, column)
+        scores = -scores if descending else scores
+        if 0 < k < self.length:
+            selection = np.argpartition(scores, k - 1)[:k]
+        else:
+            selection = np.arange(self.length)
+        selection = selection[np.argsort(scores[selection], kind="stable")]
+        return self.take(selection[:k] if k > 0 else selection)
+
+    def to_rows(self) -> List[dict]:
+        decoded = {}
+        for name, column in self.columns.items():
+            if self.is_text(name):
+                vocab = self.vocabs[name]
+                decoded[name] = [
+                    vocab[code] if code >= 0 else None for code in column.tolist()
+                ]
+            else:
+                decoded[name] = [
+                    (
+                        None
+                        if value != value
+                        else int(value) if value.is_integer() else value
+                    )
+                    for value in column.tolist()
+                ]
+        names = list(decoded)
+        return [dict(zip(names, values)) for values in zip(*decoded.values())]
+
+
+def query_keyword_table(
+    table: KeywordTable,
+    conditions: List[Tuple[str, str, str]],
+    group_by: Optional[str] = None,
+    value: Optional[str] = None,
+    aggregate: str = "sum",
+    sort_by: Optional[str] = None,
+    top_k: int = 50,
+) -> Tuple[KeywordTable, int]:
+    if conditions:
+        table = table.where(conditions)
+    matched = len(table)
+    if group_by is not None:
+        if value is not None:
+            value = table.resolve(value)
+        table = table.group_by(group_by, value, aggregate)
+        if sort_by is None:
+            sort_by = (
+                f"{value}_{aggregate}"
+                if value is not None and aggregate != "count"
+                else "count"
+            )
+    if sort_by is not None:
+        table = table.top_k(sort_by, top_k)
+    elif top_k > 0:
+        table = table.take(slice(0, top_k))
+    return table, matched
+
+
+def parse_filters(filters: Optional[List[str]]) -> List[Tuple[str, str, str]]:
+    conditions = []
+    for condition in filters or []:
+        match = FILTER_PATTERN.match(condition)
+        if match is None:
+            raise ValueError(f"Invalid filter: {condition!r}")
+        conditions.append(match.groups())
+    return conditions
+
+
+URL_FIELDS = ("url", "link", "page", "landing_page", "landing")
+MINHASH_PRIME = (1 << 31) - 1
+MAX_BUCKET_PAIRS = 32
+
+
+def normalize_url(value: Any) -> Optional[str]:
+    if not isinstance(value, str) or not value.strip():
+        return None
+    url = re.sub(r"^[a-z][a-z0-9+.-]*://", "", value.strip().lower())
+    if url.startswith("www."):
+        url = url[4:]
+    return url.rstrip("/")
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    # pick bands x rows whose S-curve threshold (1/b)^(1/r) is closest to threshold
+    options = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+    return min(options, key=lambda o: abs((1 / o[0]) ** (1 / o[1]) - threshold))
+
+
+def minhash_signatures(
+    sets: List[np.ndarray], num_perm: int, seed: int = 1, chunk: int = 512
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MINHASH_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MINHASH_PRIME, size=num_perm, dtype=np.uint64)
+    signatures = np.full((len(sets), num_perm), MINHASH_PRIME, dtype=np.uint32)
+    for start in range(0, len(sets), chunk):
+        members = [
+            i for i in range(start, min(start + chunk, len(sets))) if len(sets[i])
+        ]
+        if not members:
+            continue
+        ids = np.concatenate([sets[i] for i in members]).astype(np.uint64)
+        offsets = np.cumsum([0] + [len(sets[i]) for i in members[:-1]])
+        hashed = (ids[:, None] * a + b) % MINHASH_PRIME
+        signatures[members] = np.minimum.reduceat(hashed, offsets, axis=0)
+    return signatures
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, i: int, j: int):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    shared = len(np.intersect1d(a, b, assume_unique=True))
+    return shared / (len(a) + len(b) - shared) if shared else 0.0
+
+
+def cluster_url_sets(
+    sets: List[np.ndarray], threshold: float, num_perm: int = 128
+) -> Tuple[np.ndarray, Dict[str, int]]:
+    bands, rows = lsh_bands(num_perm, threshold)
+    signatures = minhash_signatures(sets, num_perm)
+    present = np.array([len(ids) > 0 for ids in sets], dtype=bool)
+    groups = UnionFind(len(sets))
+    checked = set()
+    candidates = 0
+    verified = 0
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        order = np.argsort(keys, kind="stable")
+        order = order[present[order]]
+        starts = np.flatnonzero(
+            np.concatenate(([True], keys[order][1:] != keys[order][:-1]))
+        )
+        sizes = np.diff(np.append(starts, len(order)))
+        for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+            bucket = order[start : start + size].tolist()
+            if len(bucket) <= MAX_BUCKET_PAIRS:
+                pairs = (
+                    (bucket[i], bucket[j])
+                    for i in range(len(bucket))
+                    for j in range(i + 1, len(bucket))
+                )
+            else:
+                pairs = ((bucket[0], other) for other in bucket[1:])
+            for i, j in pairs:
+                if (i, j) in checked or groups.find(i) == groups.find(j):
+                    continue
+                checked.add((i, j))
+                candidates += 1
+                if jaccard(sets[i], sets[j]) >= threshold:
+                    verified += 1
+                    groups.union(i, j)
+    labels = np.array([groups.find(i) for i in range(len(sets))])
+    labels[~present] = -1
+    return labels, {
+        "bands": bands,
+        "rows": rows,
+        "candidate_pairs": candidates,
+        "verified_pairs": verified,
+    }
+
+
+# section name -> (projects action, takes a limit)
+PROJECT_SECTIONS = {
+    "overview": ("overview", False),
+    "keywords": ("keywords", False),
+    "best_pages": ("bestpages", True),
+    "pages_with_more_keywords": ("pageswithmorekeywords", True),
+    "pages_with_potential": ("pageswithpotential", True),
+    "winner_pages": ("winnerpages", True),
+    "loser_pages": ("loserpages", True),
+}
+DASHBOARD_SECTIONS = [
+    "overview",
+    "keywords",
+    "best_pages",
+    "pages_with_potential",
+    "winner_pages",
+    "loser_pages",
+]
+
+
 class Tools:
     class Valves(BaseModel):
         SEOZOOM_API_KEY: str = Field(
@@ -57,9 +1124,113 @@ class Tools:
             default="https://apiv2.seozoom.com/api/v2",
             description="The base URL for SEOZoom API.",
         )
+        SEOZOOM_MAX_CONNECTIONS: int = Field(
+            default=100,
+            ge=1,
+            description="Maximum number of pooled connections kept by the HTTP client.",
+        )
+        SEOZOOM_MAX_CONNECTIONS_PER_HOST: int = Field(
+            default=10,
+            ge=1,
+            description="Maximum number of concurrent connections to the SEOZoom host.",
+        )
+        SEOZOOM_KEEPALIVE_TIMEOUT: float = Field(
+            default=30.0,
+            gt=0,
+            description="Seconds an idle keep-alive connection stays in the pool.",
+        )
+        SEOZOOM_CONNECT_TIMEOUT: float = Field(
+            default=10.0,
+            gt=0,
+            description="Timeout in seconds for establishing a connection.",
+        )
+        SEOZOOM_TIMEOUT: float = Field(
+            default=60.0,
+            gt=0,
+            description="Total timeout in seconds for a single SEOZoom request.",
+        )
+        SEOZOOM_CACHE_ENABLED: bool = Field(
+            default=True,
+            description="Cache successful SEOZoom responses in memory to save API credits.",
+        )
+        SEOZOOM_CACHE_MAX_ENTRIES: int = Field(
+            default=1024,
+            ge=1,
+            description="Maximum number of responses kept in the cache.",
+        )
+        SEOZOOM_CACHE_MAX_BYTES: int = Field(
+            default=64 * 1024 * 1024,
+            ge=1,
+            description="Maximum total size in bytes of the cached responses.",
+        )
+        SEOZOOM_CACHE_TTL: int = Field(
+            default=6 * 3600,
+            ge=0,
+            description="Seconds a cached response stays fresh (0 disables caching).",
+        )
+        SEOZOOM_CACHE_SHORT_TTL: int = Field(
+            default=15 * 60,
+            ge=0,
+            description="Freshness in seconds for SERP and project responses.",
+        )
+        SEOZOOM_CACHE_HISTORY_TTL: int = Field(
+            default=30 * 24 * 3600,
+            ge=0,
+            description="Freshness in seconds for history lookups with a fixed date.",
+        )
+        SEOZOOM_PERSISTENT_CACHE_DIR: str = Field(
+            default="",
+            description="Directory of the on-disk store for dated history lookups (empty disables it).",
+        )
+        SEOZOOM_BULK_CONCURRENCY: int = Field(
+            default=5,
+            ge=1,
+            le=50,
+            description="Maximum number of concurrent requests issued by bulk methods.",
+        )
+        SEOZOOM_RATE_LIMIT: float = Field(
+            default=5.0,
+            ge=0,
+            description="Sustained requests per second allowed per API key (0 disables the limiter).",
+        )
+        SEOZOOM_RATE_LIMIT_BURST: int = Field(
+            default=10,
+            ge=1,
+            description="Number of requests per API key that may be sent in a burst.",
+        )
+        SEOZOOM_MAX_RETRIES: int = Field(
+            default=3,
+            ge=0,
+            le=10,
+            description="Retries for throttled (429) or failed (5xx) requests.",
+        )
+        SEOZOOM_BACKOFF_BASE: float = Field(
+            default=1.0,
+            gt=0,
+            description="Base delay in seconds of the exponential retry backoff.",
+        )
+        SEOZOOM_BACKOFF_MAX: float = Field(
+            default=30.0,
+            gt=0,
+            description="Maximum delay in seconds between two retries.",
+        )
+        SEOZOOM_RAW_RESPONSES: bool = Field(
+            default=True,
+            description="Return SEOZoom response bodies unchanged instead of parsing and re-serializing them.",
+        )
+        SEOZOOM_OUTPUT_MAX_BYTES: int = Field(
+            default=0,
+            ge=0,
+            description="Truncate tool output to about this many bytes, reporting omitted rows (0 disables it).",
+        )
 
     def __init__(self):
         self.valves = self.Valves()
+        self.transport = SEOZoomTransport()
+        self.cache = ResponseCache()
+        self.store = PersistentCache()
+        self.inflight = SingleFlight()
+        self.limiter = RateLimiter()
 
     async def seozoom_request(
         self,
@@ -68,8 +1239,28 @@ class Tools:
         params: dict,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
+        raw: bool = False,
     ) -> str:
         emitter = EventEmitter(__event_emitter__)
+        if output_format not in OUTPUT_FORMATS:
+            error = f"Unsupported output format: {output_format}"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+
+        def render(text: str) -> str:
+            if raw:
+                return text
+            return format_payload(
+                text,
+                fields,
+                output_format,
+                max_rows,
+                self.valves.SEOZOOM_OUTPUT_MAX_BYTES,
+            )
+
         await emitter.emit(f"Making request to SEOZoom API: {action}")
         if "valves" not in __user__:
             __user__["valves"] = self.Valves()
@@ -79,47 +1270,258 @@ class Tools:
                 status="error", description="API key is required", done=True
             )
             return json.dumps({"error": "API key is required"})
+        self.store.configure(self.valves.SEOZOOM_PERSISTENT_CACHE_DIR)
+        persistent = self.store.enabled and is_immutable(action, params)
+        key = cache_key(endpoint, action, params, api_key)
+        if self.valves.SEOZOOM_CACHE_ENABLED:
+            self.cache.configure(
+                self.valves.SEOZOOM_CACHE_MAX_ENTRIES,
+                self.valves.SEOZOOM_CACHE_MAX_BYTES,
+            )
+            cached = self.cache.get(key)
+            if cached is not None:
+                await emitter.emit(
+                    status="complete",
+                    description=f"Served {action} from cache ({self.cache.stats()})",
+                    done=True,
+                )
+                return render(cached)
+        if persistent:
+            try:
+                stored = await asyncio.to_thread(self.store.get, key)
+            except (sqlite3.Error, OSError):
+                stored = None
+            if stored is not None:
+                if self.valves.SEOZOOM_CACHE_ENABLED:
+                    self.cache.set(
+                        key, stored, cache_ttl(endpoint, action, params, self.valves)
+                    )
+                await emitter.emit(
+                    status="complete",
+                    description=f"Served {action} from persistent cache",
+                    done=True,
+                )
+                return render(stored)
         url = f"{self.valves.SEOZOOM_API_BASE_URL}/{endpoint}/"
         params["api_key"] = api_key
         params["action"] = action
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            await emitter.emit(
-                status="complete",
-                description=f"Successfully fetched data for action: {action}",
-                done=True,
-            )
-            return json.dumps(data)
-        except requests.exceptions.RequestException as e:
+
+        async def fetch() -> Tuple[str, Optional[str], str]:
+            retries = 0
+            waited = 0.0
+            while True:
+                error = None
+                waited += await self.limiter.acquire(
+                    api_key,
+                    self.valves.SEOZOOM_RATE_LIMIT,
+                    self.valves.SEOZOOM_RATE_LIMIT_BURST,
+                )
+                retry_after = None
+                try:
+                    session = await self.transport.get_session(self.valves)
+                    async with session.get(url, params=params) as response:
+                        if response.status < 400:
+                            body = await response.read()
+                            expected = response.content_length
+                            if (
+                                expected is not None
+                                and "Content-Encoding" not in response.headers
+                                and len(body) != expected
+                            ):
+                                error = (
+                                    f"Truncated response from SEOZoom API "
+                                    f"({len(body)} of {expected} bytes)"
+                                )
+                            break
+                        error = f"HTTP {response.status} {response.reason}"
+                        if response.status not in RETRY_STATUSES:
+                            break
+                        retry_after = parse_retry_after(
+                            response.headers.get("Retry-After")
+                        )
+                except asyncio.TimeoutError:
+                    error = (
+                        f"Request timed out after {self.valves.SEOZOOM_TIMEOUT} seconds"
+                    )
+                    break
+                except aiohttp.ClientError as e:
+                    error = str(e)
+                    break
+                if retries >= self.valves.SEOZOOM_MAX_RETRIES:
+                    break
+                delay = backoff_delay(
+                    retries,
+                    self.valves.SEOZOOM_BACKOFF_BASE,
+                    self.valves.SEOZOOM_BACKOFF_MAX,
+                )
+                if retry_after is not None:
+                    if retry_after > self.valves.SEOZOOM_BACKOFF_MAX:
+                        error += f", retry after {retry_after:.0f} seconds"
+                        break
+                    delay = max(delay, retry_after)
+                retries += 1
+                await emitter.emit(
+                    f"{error} for action {action}, retry {retries}/"
+                    f"{self.valves.SEOZOOM_MAX_RETRIES} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                waited += delay
+            note = ""
+            if retries or waited >= 0.1:
+                note = f" ({retries} retries, waited {waited:.1f}s)"
+            if error is not None:
+                return json.dumps({"error": error}), error + note, note
+            result = body.decode("utf-8", errors="replace")
+            error = payload_error(result)
+            if error is None and (persistent or not self.valves.SEOZOOM_RAW_RESPONSES):
+                # Stored snapshots are kept forever, so they are fully parsed
+                # instead of relying on the cheap checks in payload_error.
+                try:
+                    data = json.loads(result)
+                except ValueError:
+                    error = MALFORMED_JSON
+                else:
+                    if not self.valves.SEOZOOM_RAW_RESPONSES:
+                        result = json.dumps(data)
+                    del data
+            if error is not None:
+                return json.dumps({"error": error}), error + note, note
+            if persistent:
+                try:
+                    await asyncio.to_thread(self.store.set, key, result)
+                except (sqlite3.Error, OSError):
+                    pass
+            if self.valves.SEOZOOM_CACHE_ENABLED:
+                self.cache.set(
+                    key, result, cache_ttl(endpoint, action, params, self.valves)
+                )
+            return result, None, note
+
+        # Responses are shared across API keys through the cache, but an
+        # in-flight request is sent, rate limited and rejected under the key of
+        # the caller that started it, so only callers with the same key join it.
+        (result, error, note), shared = await self.inflight.do(
+            f"{key_fingerprint(api_key)}:{key}", fetch
+        )
+        if error is not None:
             await emitter.emit(
-                status="error", description=f"Error fetching data: {str(e)}", done=True
+                status="error", description=f"Error fetching data: {error}", done=True
             )
-            return json.dumps({"error": str(e)})
+            return result
+        description = f"Successfully fetched data for action: {action}{note}"
+        if shared:
+            description += " (shared with an identical in-flight request)"
+        if self.valves.SEOZOOM_CACHE_ENABLED:
+            description += f" ({self.cache.stats()})"
+        await emitter.emit(
+            status="complete",
+            description=description,
+            done=True,
+        )
+        return render(result)
+
+    async def seozoom_bulk_request(
+        self,
+        endpoint: str,
+        action: str,
+        item_param: str,
+        items: List[str],
+        params: dict,
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        emitter = EventEmitter(__event_emitter__)
+        total = len(items)
+        results: List[Optional[dict]] = [None] * total
+        completed = 0
+        errors = 0
+
+        async def collect(index: int, item: str, data: Any):
+            nonlocal completed, errors
+            entry = {item_param: item}
+            if isinstance(data, dict) and "error" in data:
+                entry["error"] = data["error"]
+                errors += 1
+            else:
+                entry["data"] = data
+            results[index] = entry
+            completed += 1
+            await emitter.emit(f"Fetched {action} for {completed}/{total} items")
+
+        await emitter.emit(f"Making {total} bulk requests to SEOZoom API: {action}")
+        await bulk_fetch(
+            self, endpoint, action, item_param, items, params, collect, __user__
+        )
+        await emitter.emit(
+            status="complete",
+            description=f"Fetched {action} for {total} items ({errors} errors)",
+            done=True,
+        )
+        return format_payload(
+            json.dumps({"results": results, "errors": errors}),
+            max_bytes=self.valves.SEOZOOM_OUTPUT_MAX_BYTES,
+        )
 
     async def get_keyword_metrics(
         self,
         keyword: str,
         db: str = "it",
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "keyword": keyword}
         return await self.seozoom_request(
-            "keywords", "metrics", params, __event_emitter__, __user__
+            "keywords",
+            "metrics",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
+        )
+
+    async def get_keyword_metrics_bulk(
+        self,
+        keywords: List[str],
+        db: str = "it",
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        params = {"db": db}
+        return await self.seozoom_bulk_request(
+            "keywords",
+            "metrics",
+            "keyword",
+            keywords,
+            params,
+            __event_emitter__,
+            __user__,
         )
 
     async def get_keyword_serp(
         self,
         keyword: str,
         db: str = "it",
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "keyword": keyword}
         return await self.seozoom_request(
-            "keywords", "serp", params, __event_emitter__, __user__
+            "keywords",
+            "serp",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_keyword_serp_history(
@@ -127,6 +1529,9 @@ class Tools:
         keyword: str,
         db: str = "it",
         date: str = None,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
@@ -134,7 +1539,14 @@ class Tools:
         if date:
             params["date"] = date
         return await self.seozoom_request(
-            "keywords", "serphistory", params, __event_emitter__, __user__
+            "keywords",
+            "serphistory",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_keyword_related(
@@ -142,24 +1554,300 @@ class Tools:
         keyword: str,
         db: str = "it",
         limit: int = 100,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "keyword": keyword, "limit": limit}
         return await self.seozoom_request(
-            "keywords", "related", params, __event_emitter__, __user__
+            "keywords",
+            "related",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
+        )
+
+    async def get_keyword_clusters(
+        self,
+        keywords: List[str],
+        db: str = "it",
+        threshold: float = 0.3,
+        top_n: int = 10,
+        num_perm: int = 128,
+        min_cluster_size: int = 2,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        emitter = EventEmitter(__event_emitter__)
+        if output_format not in OUTPUT_FORMATS:
+            error = f"Unsupported output format: {output_format}"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        if not 0 < threshold <= 1 or num_perm < 1 or top_n < 1:
+            error = "threshold must be in (0, 1], num_perm and top_n at least 1"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        keywords = list(
+            dict.fromkeys(k for k in map(normalize_keyword, keywords) if k is not None)
+        )
+        total = len(keywords)
+        if not total:
+            error = "At least one keyword is required"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        url_index: Dict[str, int] = {}
+        sets: List[np.ndarray] = [np.empty(0, dtype=np.int32)] * total
+        errors: Dict[str, str] = {}
+        completed = 0
+
+        async def collect(index: int, keyword: str, data: Any):
+            nonlocal completed
+            if isinstance(data, dict) and "error" in data:
+                errors[keyword] = str(data["error"])
+            else:
+                ids = set()
+                for row in extract_rows(data)[:top_n]:
+                    url = normalize_url(pick_field(row, URL_FIELDS))
+                    if url is not None:
+                        ids.add(url_index.setdefault(url, len(url_index)))
+                sets[index] = np.array(sorted(ids), dtype=np.int32)
+            completed += 1
+            if completed % 100 == 0 or completed == total:
+                await emitter.emit(f"Fetched SERPs for {completed}/{total} keywords")
+
+        await emitter.emit(f"Fetching SERPs for {total} keywords")
+        await bulk_fetch(
+            self, "keywords", "serp", "keyword", keywords, {"db": db}, collect, __user__
+        )
+        await emitter.emit(f"Clustering {total} keywords by SERP overlap")
+        labels, stats = await asyncio.to_thread(
+            cluster_url_sets, sets, threshold, num_perm
+        )
+        members: Dict[int, List[int]] = {}
+        for index, label in enumerate(labels.tolist()):
+            if label >= 0:
+                members.setdefault(label, []).append(index)
+        urls = list(url_index)
+        clusters = []
+        unclustered = []
+        for group in sorted(members.values(), key=len, reverse=True):
+            if len(group) < min_cluster_size:
+                unclustered.extend(keywords[i] for i in group)
+                continue
+            counts = np.bincount(np.concatenate([sets[i] for i in group]))
+            top_urls = [urls[i] for i in np.argsort(-counts, kind="stable")[:3]]
+            clusters.append(
+                {
+                    "id": len(clusters) + 1,
+                    "size": len(group),
+                    "keywords": [keywords[i] for i in group],
+                    "top_urls": top_urls,
+                }
+            )
+        await emitter.emit(
+            status="complete",
+            description=(
+                f"Grouped {total} keywords into {len(clusters)} clusters "
+                f"({len(unclustered)} unclustered, {len(errors)} errors)"
+            ),
+            done=True,
+        )
+        if output_format != "json":
+            rows = [
+                {"cluster": c["id"], "size": c["size"], "keyword": keyword}
+                for c in clusters
+                for keyword in c["keywords"]
+            ]
+            return format_payload(
+                json.dumps(rows, ensure_ascii=False),
+                None,
+                output_format,
+                max_rows,
+                self.valves.SEOZOOM_OUTPUT_MAX_BYTES,
+            )
+        stats.update(keywords=total, urls=len(urls), clusters=len(clusters))
+        return json.dumps(
+            {
+                "clusters": clusters[:max_rows] if max_rows else clusters,
+                "unclustered": unclustered,
+                "errors": errors,
+                "stats": stats,
+            },
+            ensure_ascii=False,
+        )
+
+    async def get_keyword_tree(
+        self,
+        seeds: List[str],
+        db: str = "it",
+        depth: int = 2,
+        per_level: int = 20,
+        limit: int = 100,
+        min_volume: int = 0,
+        max_requests: int = 50,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        emitter = EventEmitter(__event_emitter__)
+        if output_format not in OUTPUT_FORMATS:
+            error = f"Unsupported output format: {output_format}"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        skip_fields = {field_name(name) for name in KEYWORD_FIELDS + VOLUME_FIELDS}
+        found: Dict[str, dict] = {}
+        frontier = []
+        for seed in seeds:
+            keyword = normalize_keyword(seed)
+            if keyword is not None and keyword not in found:
+                found[keyword] = {
+                    "keyword": keyword,
+                    "level": 0,
+                    "parent": None,
+                    "volume": None,
+                }
+                frontier.append(keyword)
+        if not frontier:
+            error = "At least one seed keyword is required"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        roots = len(frontier)
+        errors: Dict[str, str] = {}
+        requests = 0
+        pruned = 0
+        semaphore = asyncio.Semaphore(self.valves.SEOZOOM_BULK_CONCURRENCY)
+
+        async def fetch_related(keyword: str) -> Tuple[str, Any]:
+            async with semaphore:
+                try:
+                    return keyword, json.loads(
+                        await self.seozoom_request(
+                            "keywords",
+                            "related",
+                            {"db": db, "keyword": keyword, "limit": limit},
+                            None,
+                            __user__,
+                            raw=True,
+                        )
+                    )
+                except Exception as e:
+                    return keyword, {"error": str(e)}
+
+        for level in range(1, depth + 1):
+            frontier.sort(key=lambda k: -(found[k]["volume"] or 0))
+            batch = frontier[: min(per_level, max(0, max_requests - requests))]
+            if not batch:
+                break
+            requests += len(batch)
+            frontier = []
+            await emitter.emit(f"Expanding {len(batch)} keywords at level {level}")
+            for task in asyncio.as_completed([fetch_related(k) for k in batch]):
+                parent, data = await task
+                if isinstance(data, dict) and "error" in data:
+                    errors[parent] = str(data["error"])
+                    continue
+                new = []
+                for row in extract_rows(data):
+                    keyword = normalize_keyword(pick_field(row, KEYWORD_FIELDS))
+                    if keyword is None or keyword in found:
+                        continue
+                    volume = to_number(pick_field(row, VOLUME_FIELDS))
+                    if volume is not None and volume < min_volume:
+                        pruned += 1
+                        continue
+                    record = {
+                        "keyword": keyword,
+                        "level": level,
+                        "parent": parent,
+                        "volume": volume,
+                    }
+                    if isinstance(row, dict):
+                        for name, value in row.items():
+                            if (
+                                field_name(str(name)) not in skip_fields
+                                and name not in record
+                                and not isinstance(value, (dict, list))
+                            ):
+                                record[name] = value
+                    found[keyword] = record
+                    new.append(keyword)
+                frontier.extend(new)
+                if new:
+                    preview = ", ".join(new[:5]) + (", ..." if len(new) > 5 else "")
+                    await emitter.emit(
+                        f"{len(new)} new keywords from '{parent}' "
+                        f"({len(found)} total): {preview}"
+                    )
+
+        budget_exhausted = bool(frontier) and requests >= max_requests
+        await emitter.emit(
+            status="complete",
+            description=(
+                f"Expanded {roots} seeds into {len(found)} keywords with "
+                f"{requests} requests ({pruned} pruned, {len(errors)} errors)"
+                + (" (request budget exhausted)" if budget_exhausted else "")
+            ),
+            done=True,
+        )
+        rows = json.dumps(list(found.values()), ensure_ascii=False)
+        if output_format != "json":
+            return format_payload(
+                rows,
+                fields,
+                output_format,
+                max_rows,
+                self.valves.SEOZOOM_OUTPUT_MAX_BYTES,
+            )
+        return json.dumps(
+            {
+                "seeds": seeds,
+                "db": db,
+                "requests": requests,
+                "budget_exhausted": budget_exhausted,
+                "pruned": pruned,
+                "keywords": json.loads(
+                    format_payload(
+                        rows,
+                        fields,
+                        "json",
+                        max_rows,
+                        self.valves.SEOZOOM_OUTPUT_MAX_BYTES,
+                    )
+                ),
+                "errors": errors,
+            },
+            ensure_ascii=False,
         )
 
     async def get_domain_metrics(
         self,
         domain: str,
         db: str = "it",
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "domain": domain}
         return await self.seozoom_request(
-            "domains", "metrics", params, __event_emitter__, __user__
+            "domains",
+            "metrics",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_domain_metrics_history(
@@ -167,6 +1855,9 @@ class Tools:
         domain: str,
         db: str = "it",
         date: str = None,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
@@ -174,19 +1865,54 @@ class Tools:
         if date:
             params["date"] = date
         return await self.seozoom_request(
-            "domains", "metricshistory", params, __event_emitter__, __user__
+            "domains",
+            "metricshistory",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_domain_authority(
         self,
         domain: str,
         db: str = "it",
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "domain": domain}
         return await self.seozoom_request(
-            "domains", "authority", params, __event_emitter__, __user__
+            "domains",
+            "authority",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
+        )
+
+    async def get_domain_authority_bulk(
+        self,
+        domains: List[str],
+        db: str = "it",
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        params = {"db": db}
+        return await self.seozoom_bulk_request(
+            "domains",
+            "authority",
+            "domain",
+            domains,
+            params,
+            __event_emitter__,
+            __user__,
         )
 
     async def get_domain_niches(
@@ -194,12 +1920,22 @@ class Tools:
         domain: str,
         db: str = "it",
         limit: int = 10,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "domain": domain, "limit": limit}
         return await self.seozoom_request(
-            "domains", "niches", params, __event_emitter__, __user__
+            "domains",
+            "niches",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_domain_best_pages(
@@ -207,12 +1943,22 @@ class Tools:
         domain: str,
         db: str = "it",
         limit: int = 40,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "domain": domain, "limit": limit}
         return await self.seozoom_request(
-            "domains", "bestpages", params, __event_emitter__, __user__
+            "domains",
+            "bestpages",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_domain_keywords(
@@ -222,6 +1968,9 @@ class Tools:
         type: str = "up",
         offset: int = 0,
         limit: int = 100,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
@@ -233,7 +1982,127 @@ class Tools:
             "limit": limit,
         }
         return await self.seozoom_request(
-            "domains", "keywords", params, __event_emitter__, __user__
+            "domains",
+            "keywords",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
+        )
+
+    async def get_domain_keywords_all(
+        self,
+        domain: str,
+        db: str = "it",
+        type: str = "up",
+        max_rows: int = 1000,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        emitter = EventEmitter(__event_emitter__)
+        if output_format not in OUTPUT_FORMATS:
+            error = f"Unsupported output format: {output_format}"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        await emitter.emit(f"Fetching up to {max_rows} keywords for {domain}")
+        rows = []
+        try:
+            async for row in iter_domain_keywords(
+                self, domain, db, type, max_rows=max_rows, __user__=__user__
+            ):
+                rows.append(row)
+                if len(rows) % 100 == 0:
+                    await emitter.emit(f"Fetched {len(rows)} keywords for {domain}")
+        except SEOZoomError as e:
+            await emitter.emit(
+                status="error", description=f"Error fetching data: {str(e)}", done=True
+            )
+            return json.dumps({"error": str(e), "partial_results": rows})
+        await emitter.emit(
+            status="complete",
+            description=f"Fetched {len(rows)} keywords for {domain}",
+            done=True,
+        )
+        return format_payload(
+            json.dumps(rows, ensure_ascii=False),
+            fields,
+            output_format,
+            None,
+            self.valves.SEOZOOM_OUTPUT_MAX_BYTES,
+        )
+
+    async def get_domain_keywords_table(
+        self,
+        domain: str,
+        db: str = "it",
+        type: str = "up",
+        max_rows: int = 10000,
+        filters: Optional[List[str]] = None,
+        group_by: Optional[str] = None,
+        value: Optional[str] = None,
+        aggregate: str = "sum",
+        sort_by: Optional[str] = None,
+        top_k: int = 50,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        emitter = EventEmitter(__event_emitter__)
+        if output_format not in OUTPUT_FORMATS:
+            error = f"Unsupported output format: {output_format}"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        try:
+            conditions = parse_filters(filters)
+        except ValueError as e:
+            await emitter.emit(status="error", description=str(e), done=True)
+            return json.dumps({"error": str(e)})
+        await emitter.emit(f"Fetching up to {max_rows} keywords for {domain}")
+        builder = KeywordTableBuilder()
+        try:
+            async for row in iter_domain_keywords(
+                self, domain, db, type, max_rows=max_rows, __user__=__user__
+            ):
+                builder.append(row)
+                if builder.count % 1000 == 0:
+                    await emitter.emit(f"Fetched {builder.count} keywords for {domain}")
+        except SEOZoomError as e:
+            await emitter.emit(
+                status="error", description=f"Error fetching data: {str(e)}", done=True
+            )
+            return json.dumps({"error": str(e), "rows_fetched": builder.count})
+        try:
+            table, matched = query_keyword_table(
+                builder.build(),
+                conditions,
+                group_by,
+                value,
+                aggregate,
+                sort_by,
+                top_k,
+            )
+        except ValueError as e:
+            await emitter.emit(status="error", description=str(e), done=True)
+            return json.dumps({"error": str(e)})
+        await emitter.emit(
+            status="complete",
+            description=(
+                f"Fetched {builder.count} keywords for {domain}, "
+                f"{matched} matched, {len(table)} returned"
+            ),
+            done=True,
+        )
+        return format_payload(
+            json.dumps(table.to_rows(), ensure_ascii=False),
+            fields,
+            output_format,
+            None,
+            self.valves.SEOZOOM_OUTPUT_MAX_BYTES,
         )
 
     async def get_domain_competitor(
@@ -241,36 +2110,193 @@ class Tools:
         domain: str,
         db: str = "it",
         limit: int = 40,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "domain": domain, "limit": limit}
         return await self.seozoom_request(
-            "domains", "competitor", params, __event_emitter__, __user__
+            "domains",
+            "competitor",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
+        )
+
+    async def get_competitor_graph(
+        self,
+        domain: str,
+        db: str = "it",
+        depth: int = 2,
+        fanout: int = 10,
+        max_requests: int = 50,
+        output_format: str = "json",
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        emitter = EventEmitter(__event_emitter__)
+        if output_format not in OUTPUT_FORMATS:
+            error = f"Unsupported output format: {output_format}"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        root = normalize_domain(domain) or domain.strip().lower()
+        levels = {root: 0}
+        adjacency: Dict[str, List[dict]] = {}
+        errors: Dict[str, str] = {}
+        frontier = [root]
+        requests = 0
+        semaphore = asyncio.Semaphore(self.valves.SEOZOOM_BULK_CONCURRENCY)
+
+        async def fetch_competitors(source: str) -> Any:
+            async with semaphore:
+                try:
+                    return json.loads(
+                        await self.seozoom_request(
+                            "domains",
+                            "competitor",
+                            {"db": db, "domain": source, "limit": fanout + 1},
+                            None,
+                            __user__,
+                            raw=True,
+                        )
+                    )
+                except Exception as e:
+                    return {"error": str(e)}
+
+        for level in range(depth):
+            batch = frontier[: max(0, max_requests - requests)]
+            if not batch:
+                break
+            await emitter.emit(
+                f"Fetching competitors of {len(batch)} domains at depth {level + 1}"
+            )
+            results = await asyncio.gather(*(fetch_competitors(d) for d in batch))
+            requests += len(batch)
+            frontier = []
+            for source, data in zip(batch, results):
+                if isinstance(data, dict) and "error" in data:
+                    errors[source] = str(data["error"])
+                    continue
+                edges = adjacency[source] = []
+                for row in extract_rows(data):
+                    target = normalize_domain(pick_field(row, DOMAIN_FIELDS))
+                    if target is None or target == source:
+                        continue
+                    edges.append(
+                        {
+                            "domain": target,
+                            "rank": len(edges) + 1,
+                            "overlap": to_number(pick_field(row, OVERLAP_FIELDS)),
+                        }
+                    )
+                    if target not in levels:
+                        levels[target] = level + 1
+                        frontier.append(target)
+                    if len(edges) >= fanout:
+                        break
+            await emitter.emit(
+                f"Depth {level + 1}: {len(levels)} domains found, "
+                f"{requests}/{max_requests} requests used"
+            )
+
+        budget_exhausted = bool(frontier) and requests >= max_requests
+        await emitter.emit(
+            status="complete",
+            description=(
+                f"Competitor graph for {root}: {len(levels)} domains, "
+                f"{requests} requests, {len(errors)} errors"
+                + (" (request budget exhausted)" if budget_exhausted else "")
+            ),
+            done=True,
+        )
+        if output_format != "json":
+            rows = [
+                {"source": source, **edge}
+                for source, edges in adjacency.items()
+                for edge in edges
+            ]
+            return format_payload(
+                json.dumps(rows, ensure_ascii=False),
+                None,
+                output_format,
+                None,
+                self.valves.SEOZOOM_OUTPUT_MAX_BYTES,
+            )
+        return json.dumps(
+            {
+                "root": root,
+                "db": db,
+                "requests": requests,
+                "budget_exhausted": budget_exhausted,
+                "nodes": [
+                    {"domain": d, "level": lvl, "expanded": d in adjacency}
+                    for d, lvl in levels.items()
+                ],
+                "adjacency": adjacency,
+                "errors": errors,
+            },
+            ensure_ascii=False,
         )
 
     async def get_url_page_zoom_authority(
         self,
         url: str,
         db: str = "it",
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "url": url}
         return await self.seozoom_request(
-            "urls", "urlpza", params, __event_emitter__, __user__
+            "urls",
+            "urlpza",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_url_metrics(
         self,
         url: str,
         db: str = "it",
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "url": url}
         return await self.seozoom_request(
-            "urls", "metrics", params, __event_emitter__, __user__
+            "urls",
+            "metrics",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
+        )
+
+    async def get_url_metrics_bulk(
+        self,
+        urls: List[str],
+        db: str = "it",
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        params = {"db": db}
+        return await self.seozoom_bulk_request(
+            "urls", "metrics", "url", urls, params, __event_emitter__, __user__
         )
 
     async def get_url_keywords(
@@ -278,12 +2304,97 @@ class Tools:
         url: str,
         db: str = "it",
         limit: int = 10,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "url": url, "limit": limit}
         return await self.seozoom_request(
-            "urls", "keywords", params, __event_emitter__, __user__
+            "urls",
+            "keywords",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
+        )
+
+    async def get_url_keywords_table(
+        self,
+        url: str,
+        db: str = "it",
+        limit: int = 1000,
+        filters: Optional[List[str]] = None,
+        group_by: Optional[str] = None,
+        value: Optional[str] = None,
+        aggregate: str = "sum",
+        sort_by: Optional[str] = None,
+        top_k: int = 50,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        emitter = EventEmitter(__event_emitter__)
+        if output_format not in OUTPUT_FORMATS:
+            error = f"Unsupported output format: {output_format}"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        try:
+            conditions = parse_filters(filters)
+        except ValueError as e:
+            await emitter.emit(status="error", description=str(e), done=True)
+            return json.dumps({"error": str(e)})
+        await emitter.emit(f"Fetching up to {limit} keywords for {url}")
+        result = await self.seozoom_request(
+            "urls",
+            "keywords",
+            {"db": db, "url": url, "limit": limit},
+            None,
+            __user__,
+            raw=True,
+        )
+        error = payload_error(result)
+        if error is not None:
+            await emitter.emit(
+                status="error", description=f"Error fetching data: {error}", done=True
+            )
+            return json.dumps({"error": error})
+        builder = KeywordTableBuilder()
+        for row in extract_rows(json.loads(result)):
+            if isinstance(row, dict):
+                builder.append(row)
+        del result
+        try:
+            table, matched = query_keyword_table(
+                builder.build(),
+                conditions,
+                group_by,
+                value,
+                aggregate,
+                sort_by,
+                top_k,
+            )
+        except ValueError as e:
+            await emitter.emit(status="error", description=str(e), done=True)
+            return json.dumps({"error": str(e)})
+        await emitter.emit(
+            status="complete",
+            description=(
+                f"Fetched {builder.count} keywords for {url}, "
+                f"{matched} matched, {len(table)} returned"
+            ),
+            done=True,
+        )
+        return format_payload(
+            json.dumps(table.to_rows(), ensure_ascii=False),
+            fields,
+            output_format,
+            None,
+            self.valves.SEOZOOM_OUTPUT_MAX_BYTES,
         )
 
     async def get_url_intent_gap(
@@ -291,47 +2402,87 @@ class Tools:
         url: str,
         db: str = "it",
         limit: int = 100,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "url": url, "limit": limit}
         return await self.seozoom_request(
-            "urls", "intentgap", params, __event_emitter__, __user__
+            "urls",
+            "intentgap",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_projects_list(
         self,
         db: str = "it",
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db}
         return await self.seozoom_request(
-            "projects", "list", params, __event_emitter__, __user__
+            "projects",
+            "list",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_project_overview(
         self,
         project_id: str,
         db: str = "it",
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "id": project_id}
         return await self.seozoom_request(
-            "projects", "overview", params, __event_emitter__, __user__
+            "projects",
+            "overview",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_project_keywords(
         self,
         project_id: str,
         db: str = "it",
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "id": project_id}
         return await self.seozoom_request(
-            "projects", "keywords", params, __event_emitter__, __user__
+            "projects",
+            "keywords",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_project_best_pages(
@@ -339,12 +2490,22 @@ class Tools:
         project_id: str,
         db: str = "it",
         limit: int = 100,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "id": project_id, "limit": limit}
         return await self.seozoom_request(
-            "projects", "bestpages", params, __event_emitter__, __user__
+            "projects",
+            "bestpages",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_project_pages_with_more_keywords(
@@ -352,12 +2513,22 @@ class Tools:
         project_id: str,
         db: str = "it",
         limit: int = 10,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "id": project_id, "limit": limit}
         return await self.seozoom_request(
-            "projects", "pageswithmorekeywords", params, __event_emitter__, __user__
+            "projects",
+            "pageswithmorekeywords",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_project_pages_with_potential(
@@ -365,12 +2536,22 @@ class Tools:
         project_id: str,
         db: str = "it",
         limit: int = 10,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "id": project_id, "limit": limit}
         return await self.seozoom_request(
-            "projects", "pageswithpotential", params, __event_emitter__, __user__
+            "projects",
+            "pageswithpotential",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_project_winner_pages(
@@ -378,12 +2559,22 @@ class Tools:
         project_id: str,
         db: str = "it",
         limit: int = 10,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "id": project_id, "limit": limit}
         return await self.seozoom_request(
-            "projects", "winnerpages", params, __event_emitter__, __user__
+            "projects",
+            "winnerpages",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
         )
 
     async def get_project_loser_pages(
@@ -391,267 +2582,540 @@ class Tools:
         project_id: str,
         db: str = "it",
         limit: int = 10,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: dict = {},
     ) -> str:
         params = {"db": db, "id": project_id, "limit": limit}
         return await self.seozoom_request(
-            "projects", "loserpages", params, __event_emitter__, __user__
+            "projects",
+            "loserpages",
+            params,
+            __event_emitter__,
+            __user__,
+            fields,
+            output_format,
+            max_rows,
+        )
+
+    async def get_project_dashboard(
+        self,
+        project_id: str,
+        db: str = "it",
+        sections: Optional[List[str]] = None,
+        limit: int = 100,
+        fields: Optional[List[str]] = None,
+        output_format: str = "json",
+        max_rows: Optional[int] = None,
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: dict = {},
+    ) -> str:
+        emitter = EventEmitter(__event_emitter__)
+        sections = list(dict.fromkeys(sections or DASHBOARD_SECTIONS))
+        unknown = [name for name in sections if name not in PROJECT_SECTIONS]
+        if unknown:
+            error = (
+                f"Unknown dashboard sections: {', '.join(unknown)} "
+                f"(available: {', '.join(PROJECT_SECTIONS)})"
+            )
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+        if output_format not in OUTPUT_FORMATS:
+            error = f"Unsupported output format: {output_format}"
+            await emitter.emit(status="error", description=error, done=True)
+            return json.dumps({"error": error})
+
+        total = len(sections)
+        completed = 0
+        errors = 0
+
+        async def fetch_section(name: str) -> str:
+            nonlocal completed, errors
+            action, takes_limit = PROJECT_SECTIONS[name]
+            params = {"db": db, "id": project_id}
+            if takes_limit:
+                params["limit"] = limit
+            result = await self.seozoom_request(
+                "projects",
+                action,
+                params,
+                None,
+                __user__,
+                fields,
+                output_format,
+                max_rows,
+            )
+            completed += 1
+            error = payload_error(result) if result.startswith("{") else None
+            if error is not None:
+                errors += 1
+                await emitter.emit(
+                    f"Section {name} failed ({completed}/{total}): {error}"
+                )
+            else:
+                await emitter.emit(f"Fetched section {name} ({completed}/{total})")
+            return result
+
+        await emitter.emit(
+            f"Fetching {total} dashboard sections for project {project_id}"
+        )
+        results = await asyncio.gather(*(fetch_section(name) for name in sections))
+        await emitter.emit(
+            status="complete",
+            description=f"Fetched dashboard for project {project_id} ({errors} errors)",
+            done=True,
+        )
+        if output_format == "json":
+            return json.dumps(
+                {
+                    "project_id": project_id,
+                    "db": db,
+                    "sections": {
+                        name: json.loads(result)
+                        for name, result in zip(sections, results)
+                    },
+                    "errors": errors,
+                },
+                ensure_ascii=False,
+            )
+        heading = "##" if output_format == "markdown" else "#"
+        return "\n\n".join(
+            f"{heading} {name}\n{result.rstrip()}"
+            for name, result in zip(sections, results)
         )
 
 
 class IntentMapper:
+    # (trigger, phrase, handler, takes a subject, takes a date)
+    intents = [
+        (
+            "per la parola chiave",
+            "storico serp per la parola chiave",
+            "get_keyword_serp_history",
+            True,
+            True,
+        ),
+        (
+            "per la parola chiave",
+            "risultati serp per la parola chiave",
+            "get_keyword_serp",
+            True,
+            False,
+        ),
+        (
+            "per la parola chiave",
+            "metriche per la parola chiave",
+            "get_keyword_metrics",
+            True,
+            False,
+        ),
+        (
+            "parole chiave correlate",
+            "parole chiave correlate per",
+            "get_keyword_related",
+            True,
+            False,
+        ),
+        (
+            "per il dominio",
+            "storico metriche per il dominio",
+            "get_domain_metrics_history",
+            True,
+            True,
+        ),
+        (
+            "per il dominio",
+            "metriche per il dominio",
+            "get_domain_metrics",
+            True,
+            False,
+        ),
+        (
+            "per il dominio",
+            "autorità per il dominio",
+            "get_domain_authority",
+            True,
+            False,
+        ),
+        (
+            "per il dominio",
+            "nicchie per il dominio",
+            "get_domain_niches",
+            True,
+            False,
+        ),
+        (
+            "per il dominio",
+            "migliori pagine per il dominio",
+            "get_domain_best_pages",
+            True,
+            False,
+        ),
+        (
+            "per il dominio",
+            "parole chiave per il dominio",
+            "get_domain_keywords",
+            True,
+            False,
+        ),
+        (
+            "per il dominio",
+            "competitor per il dominio",
+            "get_domain_competitor",
+            True,
+            False,
+        ),
+        (
+            "per l'url",
+            "page zoom authority per l'url",
+            "get_url_page_zoom_authority",
+            True,
+            False,
+        ),
+        (
+            "per l'url",
+            "metriche per l'url",
+            "get_url_metrics",
+            True,
+            False,
+        ),
+        (
+            "per l'url",
+            "parole chiave per l'url",
+            "get_url_keywords",
+            True,
+            False,
+        ),
+        (
+            "per l'url",
+            "intent gap per l'url",
+            "get_url_intent_gap",
+            True,
+            False,
+        ),
+        (
+            "lista dei progetti",
+            "lista dei progetti",
+            "get_projects_list",
+            False,
+            False,
+        ),
+        (
+            "del progetto",
+            "panoramica del progetto",
+            "get_project_overview",
+            True,
+            False,
+        ),
+        (
+            "per il progetto",
+            "parole chiave monitorate per il progetto",
+            "get_project_keywords",
+            True,
+            False,
+        ),
+        (
+            "per il progetto",
+            "migliori pagine per il progetto",
+            "get_project_best_pages",
+            True,
+            False,
+        ),
+        (
+            "per il progetto",
+            "pagine con più parole chiave per il progetto",
+            "get_project_pages_with_more_keywords",
+            True,
+            False,
+        ),
+        (
+            "per il progetto",
+            "pagine con potenziale per il progetto",
+            "get_project_pages_with_potential",
+            True,
+            False,
+        ),
+        (
+            "per il progetto",
+            "pagine vincenti per il progetto",
+            "get_project_winner_pages",
+            True,
+            False,
+        ),
+        (
+            "per il progetto",
+            "pagine perdenti per il progetto",
+            "get_project_loser_pages",
+            True,
+            False,
+        ),
+    ]
+    db_map = {
+        "uk": "uk",
+        "regno unito": "uk",
+        "es": "es",
+        "spagna": "es",
+        "fr": "fr",
+        "francia": "fr",
+        "de": "de",
+        "germania": "de",
+        "it": "it",
+        "italia": "it",
+    }
+
     def __init__(self, tools):
         self.tools = tools
-        self.intent_map = {
-            r".*metriche per la parola chiave (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_keyword_metrics,
-                (m.group(1), m.group(2)),
-            ),
-            r".*risultati SERP per la parola chiave (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_keyword_serp,
-                (m.group(1), m.group(2)),
-            ),
-            r".*storico SERP per la parola chiave (.*)(?: per il database| in) (.*) (?:il|al|del) (\d{4}-\d{2}-\d{2})": lambda m: (
-                self.tools.get_keyword_serp_history,
-                (m.group(1), m.group(2), m.group(3)),
-            ),
-            r".*parole chiave correlate per (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_keyword_related,
-                (m.group(1), m.group(2)),
-            ),
-            r".*metriche per il dominio (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_domain_metrics,
-                (m.group(1), m.group(2)),
-            ),
-            r".*storico metriche per il dominio (.*)(?: per il database| in) (.*) (?:il|al|del) (\d{4}-\d{2}-\d{2})": lambda m: (
-                self.tools.get_domain_metrics_history,
-                (m.group(1), m.group(2), m.group(3)),
-            ),
-            r".*autorità per il dominio (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_domain_authority,
-                (m.group(1), m.group(2)),
-            ),
-            r".*nicchie per il dominio (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_domain_niches,
-                (m.group(1), m.group(2)),
-            ),
-            r".*migliori pagine per il dominio (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_domain_best_pages,
-                (m.group(1), m.group(2)),
-            ),
-            r".*parole chiave per il dominio (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_domain_keywords,
-                (m.group(1), m.group(2)),
-            ),
-            r".*competitor per il dominio (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_domain_competitor,
-                (m.group(1), m.group(2)),
-            ),
-            r".*Page Zoom Authority per l'URL (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_url_page_zoom_authority,
-                (m.group(1), m.group(2)),
-            ),
-            r".*metriche per l'URL (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_url_metrics,
-                (m.group(1), m.group(2)),
-            ),
-            r".*parole chiave per l'URL (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_url_keywords,
-                (m.group(1), m.group(2)),
-            ),
-            r".*intent gap per l'URL (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_url_intent_gap,
-                (m.group(1), m.group(2)),
-            ),
-            r".*lista dei progetti(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_projects_list,
-                (m.group(1),),
-            ),
-            r".*panoramica del progetto (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_project_overview,
-                (m.group(1), m.group(2)),
-            ),
-            r".*parole chiave monitorate per il progetto (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_project_keywords,
-                (m.group(1), m.group(2)),
-            ),
-            r".*migliori pagine per il progetto (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_project_best_pages,
-                (m.group(1), m.group(2)),
-            ),
-            r".*pagine con più parole chiave per il progetto (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_project_pages_with_more_keywords,
-                (m.group(1), m.group(2)),
-            ),
-            r".*pagine con potenziale per il progetto (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_project_pages_with_potential,
-                (m.group(1), m.group(2)),
-            ),
-            r".*pagine vincenti per il progetto (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_project_winner_pages,
-                (m.group(1), m.group(2)),
-            ),
-            r".*pagine perdenti per il progetto (.*)(?: per il database| in) (.*)": lambda m: (
-                self.tools.get_project_loser_pages,
-                (m.group(1), m.group(2)),
-            ),
-        }
-        self.db_map = {
-            "uk": "uk",
-            "regno unito": "uk",
-            "es": "es",
-            "spagna": "es",
-            "fr": "fr",
-            "francia": "fr",
-            "de": "de",
-            "germania": "de",
-            "it": "it",
-            "italia": "it",
-        }
+        databases = "|".join(re.escape(name) for name in self.db_map)
+        db_clause = rf"(?:(?: per il database| in) (?P<db>{databases}))?"
+        date_clause = r"(?: (?:il|al|del) (?P<date>\d{4}-\d{2}-\d{2}))?"
+        self.patterns = []
+        self.dispatch: Dict[str, List[tuple]] = {}
+        for trigger, phrase, name, with_subject, with_date in self.intents:
+            source = re.escape(phrase)
+            if with_subject:
+                source += r" (?P<subject>.+?)"
+            source += db_clause
+            if with_date:
+                source += date_clause
+            source += r"[\s?.!]*$"
+            entry = (
+                re.compile(source, re.IGNORECASE),
+                getattr(tools, name),
+                with_subject,
+                with_date,
+            )
+            self.patterns.append(entry[0])
+            self.dispatch.setdefault(trigger, []).append(entry)
+
+    def resolve(self, user_prompt: str) -> Optional[Tuple[Callable, tuple, dict]]:
+        lowered = user_prompt.lower()
+        for trigger, candidates in self.dispatch.items():
+            if trigger not in lowered:
+                continue
+            for pattern, handler, with_subject, with_date in candidates:
+                match = pattern.search(user_prompt)
+                if not match:
+                    continue
+                db = self.db_map.get((match.group("db") or "").lower(), "it")
+                args = (match.group("subject").strip(),) if with_subject else ()
+                kwargs = {"db": db}
+                if with_date:
+                    kwargs["date"] = match.group("date")
+                return handler, args, kwargs
+        return None
 
     async def interpret_and_execute(self, user_prompt, user):
-        user_prompt = user_prompt.lower()
-        for pattern, handler in self.intent_map.items():
-            match = re.match(pattern, user_prompt)
-            if match:
-                function, args = handler(match)
-                if len(args) == 1:
-                    db = "it"
-                    args = (args[0], db)
-                elif len(args) == 2:
-                    db = self.db_map.get(args[-1].lower(), "it")
-                    args = args[:-1] + (db,)
-                elif len(args) == 3:
-                    db = self.db_map.get(args[-2].lower(), "it")
-                    date = args[-1]
-                    args = args[:-2] + (db, date)
-
-                if function in [
-                    self.tools.get_keyword_metrics,
-                    self.tools.get_keyword_serp,
-                    self.tools.get_keyword_serp_history,
-                    self.tools.get_keyword_related,
-                ]:
-                    if function == self.tools.get_keyword_metrics:
-                        keyword, db = args
-                        return await function(keyword, db=db, __user__=user)
-                    elif function == self.tools.get_keyword_serp:
-                        keyword, db = args
-                        return await function(keyword, db=db, __user__=user)
-                    elif function == self.tools.get_keyword_serp_history:
-                        keyword, db, date = args
-                        return await function(keyword, db=db, date=date, __user__=user)
-                    elif function == self.tools.get_keyword_related:
-                        keyword, db = args
-                        return await function(keyword, db=db, __user__=user)
-                elif function in [
-                    self.tools.get_domain_metrics,
-                    self.tools.get_domain_metrics_history,
-                    self.tools.get_domain_authority,
-                    self.tools.get_domain_niches,
-                    self.tools.get_domain_best_pages,
-                    self.tools.get_domain_keywords,
-                    self.tools.get_domain_competitor,
-                ]:
-                    if function == self.tools.get_domain_metrics:
-                        domain, db = args
-                        return await function(domain, db=db, __user__=user)
-                    elif function == self.tools.get_domain_metrics_history:
-                        domain, db, date = args
-                        return await function(domain, db=db, date=date, __user__=user)
-                    elif function == self.tools.get_domain_authority:
-                        domain, db = args
-                        return await function(domain, db=db, __user__=user)
-                    elif function == self.tools.get_domain_niches:
-                        domain, db = args
-                        return await function(domain, db=db, __user__=user)
-                    elif function == self.tools.get_domain_best_pages:
-                        domain, db = args
-                        return await function(domain, db=db, __user__=user)
-                    elif function == self.tools.get_domain_keywords:
-                        domain, db = args
-                        return await function(domain, db=db, __user__=user)
-                    elif function == self.tools.get_domain_competitor:
-                        domain, db = args
-                        return await function(domain, db=db, __user__=user)
-                elif function in [
-                    self.tools.get_url_page_zoom_authority,
-                    self.tools.get_url_metrics,
-                    self.tools.get_url_keywords,
-                    self.tools.get_url_intent_gap,
-                ]:
-                    url, db = args
-                    if function == self.tools.get_url_page_zoom_authority:
-                        return await function(url, db=db, __user__=user)
-                    elif function == self.tools.get_url_metrics:
-                        return await function(url, db=db, __user__=user)
-                    elif function == self.tools.get_url_keywords:
-                        return await function(url, db=db, __user__=user)
-                    elif function == self.tools.get_url_intent_gap:
-                        return await function(url, db=db, __user__=user)
-                elif function == self.tools.get_projects_list:
-                    (db,) = args
-                    return await function(db=db, __user__=user)
-                elif function in [
-                    self.tools.get_project_overview,
-                    self.tools.get_project_keywords,
-                    self.tools.get_project_best_pages,
-                    self.tools.get_project_pages_with_more_keywords,
-                    self.tools.get_project_pages_with_potential,
-                    self.tools.get_project_winner_pages,
-                    self.tools.get_project_loser_pages,
-                ]:
-                    project_id, db = args
-                    if function == self.tools.get_project_overview:
-                        return await function(project_id, db=db, __user__=user)
-                    elif function == self.tools.get_project_keywords:
-                        return await function(project_id, db=db, __user__=user)
-                    elif function == self.tools.get_project_best_pages:
-                        return await function(project_id, db=db, __user__=user)
-                    elif function == self.tools.get_project_pages_with_more_keywords:
-                        return await function(project_id, db=db, __user__=user)
-                    elif function == self.tools.get_project_pages_with_potential:
-                        return await function(project_id, db=db, __user__=user)
-                    elif function == self.tools.get_project_winner_pages:
-                        return await function(project_id, db=db, __user__=user)
-                    elif function == self.tools.get_project_loser_pages:
-                        return await function(project_id, db=db, __user__=user)
-        return "Intent not recognized."
+        resolved = self.resolve(user_prompt)
+        if resolved is None:
+            return "Intent not recognized."
+        handler, args, kwargs = resolved
+        return await handler(*args, **kwargs, __user__=user)
+
+
+EXAMPLE_PROMPTS = [
+    "Mostrami le metriche per la parola chiave seo",
+    "Mostrami i risultati SERP per la parola chiave digital marketing per il database fr",
+    "Mostrami lo storico SERP per la parola chiave digital marketing in uk il 2025-06-01",
+    "Mostrami le parole chiave correlate per smartphone per il database de",
+    "Mostrami le metriche per il dominio example.com",
+    "Mostrami lo storico metriche per il dominio example.com per il database fr il 2025-06-01",
+    "Mostrami l'autorità per il dominio example.com",
+    "Mostrami le nicchie per il dominio example.com per il database uk",
+    "Mostrami le migliori pagine per il dominio example.com in de",
+    "Mostrami le parole chiave per il dominio example.com per il database es",
+    "Mostrami i competitor per il dominio example.com in fr",
+    "Mostrami la Page Zoom Authority per l'URL https://example.com/ per il database uk",
+    "Mostrami le metriche per l'URL https://example.com/page/",
+    "Mostrami le parole chiave per l'URL https://example.com/page/ per il database es",
+    "Mostrami l'intent gap per l'URL https://example.com/article/ in fr",
+    "Mostrami la lista dei progetti",
+    "Mostrami la panoramica del progetto <NOME PROGETTO>",
+    "Mostrami le parole chiave monitorate per il progetto <NOME PROGETTO> per il database fr",
+    "Mostrami le migliori pagine per il progetto <NOME PROGETTO> in uk",
+    "Mostrami le pagine con più parole chiave per il progetto <NOME PROGETTO> per il database de",
+    "Mostrami le pagine con potenziale per il progetto <NOME PROGETTO>",
+    "Mostrami le pagine vincenti per il progetto <NOME PROGETTO> per il database it",
+    "Mostrami le pagine perdenti per il progetto <NOME PROGETTO> in fr",
+]
+
+
+# Patterns of the IntentMapper before the dispatch table, kept as the
+# benchmark baseline.
+ORIGINAL_INTENT_PATTERNS = [
+    r".*metriche per la parola chiave (.*)(?: per il database| in) (.*)",
+    r".*risultati SERP per la parola chiave (.*)(?: per il database| in) (.*)",
+    r".*storico SERP per la parola chiave (.*)(?: per il database| in) (.*) (?:il|al|del) (\d{4}-\d{2}-\d{2})",
+    r".*parole chiave correlate per (.*)(?: per il database| in) (.*)",
+    r".*metriche per il dominio (.*)(?: per il database| in) (.*)",
+    r".*storico metriche per il dominio (.*)(?: per il database| in) (.*) (?:il|al|del) (\d{4}-\d{2}-\d{2})",
+    r".*autorità per il dominio (.*)(?: per il database| in) (.*)",
+    r".*nicchie per il dominio (.*)(?: per il database| in) (.*)",
+    r".*migliori pagine per il dominio (.*)(?: per il database| in) (.*)",
+    r".*parole chiave per il dominio (.*)(?: per il database| in) (.*)",
+    r".*competitor per il dominio (.*)(?: per il database| in) (.*)",
+    r".*Page Zoom Authority per l'URL (.*)(?: per il database| in) (.*)",
+    r".*metriche per l'URL (.*)(?: per il database| in) (.*)",
+    r".*parole chiave per l'URL (.*)(?: per il database| in) (.*)",
+    r".*intent gap per l'URL (.*)(?: per il database| in) (.*)",
+    r".*lista dei progetti(?: per il database| in) (.*)",
+    r".*panoramica del progetto (.*)(?: per il database| in) (.*)",
+    r".*parole chiave monitorate per il progetto (.*)(?: per il database| in) (.*)",
+    r".*migliori pagine per il progetto (.*)(?: per il database| in) (.*)",
+    r".*pagine con più parole chiave per il progetto (.*)(?: per il database| in) (.*)",
+    r".*pagine con potenziale per il progetto (.*)(?: per il database| in) (.*)",
+    r".*pagine vincenti per il progetto (.*)(?: per il database| in) (.*)",
+    r".*pagine perdenti per il progetto (.*)(?: per il database| in) (.*)",
+]
+
+
+def resolve_intent_original(
+    user_prompt: str, db_map: Dict[str, str]
+) -> Optional[Tuple[int, tuple]]:
+    # Matching stage of the original interpret_and_execute, without the calls.
+    user_prompt = user_prompt.lower()
+    for number, pattern in enumerate(ORIGINAL_INTENT_PATTERNS):
+        match = re.match(pattern, user_prompt)
+        if match:
+            args = match.groups()
+            if len(args) == 1:
+                args = (args[0], "it")
+            elif len(args) == 2:
+                args = args[:-1] + (db_map.get(args[-1].lower(), "it"),)
+            elif len(args) == 3:
+                args = args[:-2] + (db_map.get(args[-2].lower(), "it"), args[-1])
+            return number, args
+    return None
+
+
+def benchmark_intent_mapper(
+    intent_mapper: IntentMapper, prompts: List[str], rounds: int = 200
+) -> Dict[str, float]:
+    db_map = intent_mapper.db_map
+    results = {}
+    for name, resolve in (
+        ("original", lambda prompt: resolve_intent_original(prompt, db_map)),
+        ("dispatcher", intent_mapper.resolve),
+    ):
+        results[name + "_resolved"] = sum(
+            resolve(prompt) is not None for prompt in prompts
+        )
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for prompt in prompts:
+                resolve(prompt)
+        results[name] = rounds * len(prompts) / (time.perf_counter() - started)
+    return results
+
+
+def benchmark_keyword_table(rows: int = 100_000, rounds: int = 5) -> Dict[str, float]:
+    rng = random.Random(42)
+    intents = ["informational", "commercial", "transactional", "navigational"]
+    tracemalloc.start()
+    data = [
+        {
+            "keyword": f"keyword {i}",
+            "url": f"https://www.example.com/page-{rng.randrange(2000)}",
+            "position": rng.randint(1, 100),
+            "volume": rng.randint(0, 50000),
+            "traffic": rng.random() * 1000,
+            "intent": rng.choice(intents),
+        }
+        for i in range(rows)
+    ]
+    dict_rows_mib = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+
+    def with_dicts():
+        totals: Dict[str, float] = {}
+        for row in data:
+            if row["position"] <= 10 and row["volume"] >= 100:
+                totals[row["url"]] = totals.get(row["url"], 0) + row["traffic"]
+        return heapq.nlargest(20, totals.items(), key=lambda item: item[1])
+
+    started = time.perf_counter()
+    table = KeywordTable.from_rows(data)
+    build = time.perf_counter() - started
+
+    def with_table():
+        return (
+            table.where([("position", "<=", "10"), ("volume", ">=", "100")])
+            .group_by("url", "traffic", "sum")
+            .top_k("traffic_sum", 20)
+            .to_rows()
+        )
+
+    # The tool builds a fresh table for every call and queries it once, so
+    # the table's cost per call is build plus query; dict rows only query.
+    results = {"dict_rows_build": 0.0, "keyword_table_build": build * 1000}
+    for name, query in (("dict_rows", with_dicts), ("keyword_table", with_table)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            query()
+        results[name + "_query"] = (time.perf_counter() - started) / rounds * 1000
+        results[name + "_total"] = results[name + "_build"] + results[name + "_query"]
+    results["dict_rows_mib"] = dict_rows_mib
+    results["keyword_table_mib"] = table.nbytes / 2**20
+    return results
+
+
+def benchmark_keyword_clusters(
+    keywords: int = 20_000, topics: int = 2_000
+) -> Dict[str, float]:
+    rng = random.Random(42)
+    sets = []
+    for _ in range(keywords):
+        topic = rng.randrange(topics)
+        urls = rng.sample(range(topic * 20, topic * 20 + 12), 8)
+        urls += [10**6 + rng.randrange(10**6) for _ in range(2)]
+        sets.append(np.array(sorted(set(urls)), dtype=np.int32))
+    tracemalloc.start()
+    started = time.perf_counter()
+    labels, stats = cluster_url_sets(sets, 0.3)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "seconds": elapsed,
+        "peak_mib": peak / 2**20,
+        "clusters": len(set(labels.tolist())),
+        "candidate_pairs": stats["candidate_pairs"],
+    }
 
 
 async def main():
     tools = Tools()
-    user = {"valves": {"SEOZOOM_API_KEY": "la_tua_chiave_api_seozoom"}}
+    user = {"valves": Tools.Valves(SEOZOOM_API_KEY="la_tua_chiave_api_seozoom")}
     intent_mapper = IntentMapper(tools)
-    prompts = [
-        "Mostrami le metriche per la parola chiave seo",
-        "Mostrami i risultati SERP per la parola chiave digital marketing per il database fr",
-        "Mostrami lo storico SERP per la parola chiave digital marketing in uk il 2025-06-01",
-        "Mostrami le parole chiave correlate per smartphone per il database de",
-        "Mostrami le metriche per il dominio example.com",
-        "Mostrami lo storico metriche per il dominio example.com per il database fr il 2025-06-01",
-        "Mostrami l'autorità per il dominio example.com",
-        "Mostrami le nicchie per il dominio example.com per il database uk",
-        "Mostrami le migliori pagine per il dominio example.com in de",
-        "Mostrami le parole chiave per il dominio example.com per il database es",
-        "Mostrami i competitor per il dominio example.com in fr",
-        "Mostrami la Page Zoom Authority per l'URL https://example.com/ per il database uk",
-        "Mostrami le metriche per l'URL https://example.com/page/",
-        "Mostrami le parole chiave per l'URL https://example.com/page/ per il database es",
-        "Mostrami l'intent gap per l'URL https://example.com/article/ in fr",
-        "Mostrami la lista dei progetti",
-        "Mostrami la panoramica del progetto <NOME PROGETTO>",
-        "Mostrami le parole chiave monitorate per il progetto <NOME PROGETTO> per il database fr",
-        "Mostrami le migliori pagine per il progetto <NOME PROGETTO> in uk",
-        "Mostrami le pagine con più parole chiave per il progetto <NOME PROGETTO> per il database de",
-        "Mostrami le pagine con potenziale per il progetto <NOME PROGETTO>",
-        "Mostrami le pagine vincenti per il progetto <NOME PROGETTO> per il database it",
-        "Mostrami le pagine perdenti per il progetto <NOME PROGETTO> in fr",
-    ]
-    for prompt in prompts:
+    if "--benchmark" in sys.argv:
+        results = benchmark_intent_mapper(intent_mapper, EXAMPLE_PROMPTS)
+        for name in ("original", "dispatcher"):
+            print(
+                f"{name} intent mapper: {results[name]:,.0f} prompts/sec, "
+                f"{results[name + '_resolved']}/{len(EXAMPLE_PROMPTS)} prompts resolved"
+            )
+        print(f"speedup: {results['dispatcher'] / results['original']:.1f}x")
+        results = benchmark_keyword_table()
+        for name in ("dict_rows", "keyword_table"):
+            print(
+                f"{name}: {results[name + '_build']:.1f} ms build + "
+                f"{results[name + '_query']:.1f} ms query = "
+                f"{results[name + '_total']:.1f} ms per call on 100,000 rows, "
+                f"{results[name + '_mib']:.1f} MiB"
+            )
+        results = benchmark_keyword_clusters()
+        print(
+            f"keyword clusters: {results['seconds']:.2f}s and "
+            f"{results['peak_mib']:.1f} MiB peak for 20,000 keywords, "
+            f"{results['clusters']:,} clusters from "
+            f"{results['candidate_pairs']:,} candidate pairs"
+        )
+        return
+    for prompt in EXAMPLE_PROMPTS:
         result = await intent_mapper.interpret_and_execute(prompt, user)
         print(f"Prompt: {prompt}\nResult: {result}\n")
+    await tools.transport.close()
 
 
 if __name__ == "__main__":
@@ -6,14 +6,45 @@ description: |
 author: SEOPROOF
 author_url: https://seoproof.org
 original_git_url: https://github.com/seoproof/openwebui
-version: 0.0.4
+version: 0.0.19
 license: MIT
 """
 
 from pydantic import BaseModel, Field
+from html.parser import HTMLParser
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+from yarl import URL
 from googleapiclient.discovery import build
-from typing import Callable, Any, Optional, Dict, Tuple
+from googleapiclient.errors import HttpError
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Any,
+    Deque,
+    Optional,
+    Dict,
+    List,
+    Tuple,
+)
+import aiohttp
+import asyncio
+import codecs
+import hashlib
+import httplib2
+import ipaddress
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
 import re
+import socket
 
 
 class EventEmitter:
@@ -43,17 +74,1208 @@ class EventEmitter:
             )
 
 
+class ServiceCache:
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self.services: "OrderedDict[Tuple[str, bool], Any]" = OrderedDict()
+
+    def get(self, api_key: str, static_discovery: bool = True) -> Any:
+        key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), static_discovery)
+        service = self.services.get(key)
+        if service is not None:
+            self.services.move_to_end(key)
+            return service
+        service = build(
+            "customsearch",
+            "v1",
+            developerKey=api_key,
+            cache_discovery=False,
+            static_discovery=static_discovery,
+        )
+        self.services[key] = service
+        while len(self.services) > self.max_size:
+            self.services.popitem(last=False)
+        return service
+
+
+HEDGE_SHARE = 4
+
+
+class SearchExecutor:
+    def __init__(self):
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.max_workers = 0
+        self.running = 0
+        self.hedges = 0
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self.lock = threading.Lock()
+
+    def configure(self, max_workers: int):
+        if self.executor is None or self.max_workers != max_workers:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="smartserp"
+            )
+            self.max_workers = max_workers
+
+    # A cancelled or timed-out search keeps its thread until the HTTP call
+    # returns, so hedges and retries after a timeout only use free workers.
+    def can_hedge(self) -> bool:
+        return self.running < self.max_workers and self.hedges < max(
+            1, self.max_workers // HEDGE_SHARE
+        )
+
+    def submit(
+        self, fn: Callable[[], Any], hedge: bool = False
+    ) -> Optional["asyncio.Future"]:
+        with self.lock:
+            if hedge and not self.can_hedge():
+                return None
+            self.running += 1
+            self.hedges += hedge
+        future = self.executor.submit(fn)
+        future.add_done_callback(lambda _: self.release(hedge))
+        return asyncio.wrap_future(future)
+
+    def release(self, hedge: bool):
+        with self.lock:
+            self.running -= 1
+            self.hedges -= hedge
+            waiters, self.waiters = self.waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(wake, waiter)
+            except RuntimeError:
+                pass
+
+    async def wait_for_worker(self, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self.lock:
+                if self.running < self.max_workers:
+                    return True
+                waiter = loop.create_future()
+                self.waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                return False
+
+
+def wake(waiter: "asyncio.Future"):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def submit_search(
+    service: Any,
+    search_params: Dict[str, Any],
+    executor: SearchExecutor,
+    timeout: float,
+    hedge: bool = False,
+) -> Optional[Awaitable[Dict[str, Any]]]:
+    request = service.cse().list(**search_params)
+    http = httplib2.Http(timeout=timeout)
+    future = executor.submit(partial(request.execute, http=http), hedge)
+    return None if future is None else asyncio.wait_for(future, timeout)
+
+
+async def execute_search(
+    service: Any,
+    search_params: Dict[str, Any],
+    executor: SearchExecutor,
+    timeout: float,
+) -> Dict[str, Any]:
+    return await submit_search(service, search_params, executor, timeout)
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MIN_LATENCY_SAMPLES = 20
+MIN_TIMEOUT = 2.0
+TIMEOUT_FACTOR = 3.0
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    if not isinstance(error, HttpError):
+        return None
+    try:
+        return float(error.resp.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, HttpError):
+        return int(error.resp.status) in RETRY_STATUSES
+    return isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError))
+
+
+class LatencyTracker:
+    def __init__(self, size: int = 256):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self, ceiling: float) -> float:
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return ceiling
+        return min(ceiling, max(MIN_TIMEOUT, p99 * TIMEOUT_FACTOR))
+
+
+class SearchPolicy:
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self.timeout = 15.0
+        self.adaptive = True
+        self.max_retries = 2
+        self.backoff_base = 0.5
+        self.backoff_max = 8.0
+        self.hedge = False
+
+    def configure(self, valves: Any):
+        self.timeout = valves.request_timeout
+        self.adaptive = valves.adaptive_timeout
+        self.max_retries = valves.max_retries
+        self.backoff_base = valves.backoff_base
+        self.backoff_max = valves.backoff_max
+        self.hedge = valves.hedge_requests
+
+    async def execute(
+        self,
+        service: Any,
+        search_params: Dict[str, Any],
+        executor: SearchExecutor,
+        throttle: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            last = attempt >= self.max_retries
+            timeout = (
+                self.latency.timeout(self.timeout)
+                if self.adaptive and not last
+                else self.timeout
+            )
+            hedge_after = self.latency.percentile(0.95) if self.hedge else None
+            if throttle is not None:
+                await throttle()
+            started = time.monotonic()
+            try:
+                page = await self.hedged(
+                    service, search_params, executor, timeout, hedge_after, throttle
+                )
+            except Exception as e:
+                if last or not is_transient(e):
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                await asyncio.sleep(
+                    max(delay, min(retry_after(e) or 0, self.backoff_max))
+                )
+                if isinstance(e, asyncio.TimeoutError) and not (
+                    await executor.wait_for_worker(timeout)
+                ):
+                    raise
+                attempt += 1
+                continue
+            self.latency.record(time.monotonic() - started)
+            return page
+
+    async def hedged(
+        self,
+        service: Any,
+        search_params: Dict[str, Any],
+        executor: SearchExecutor,
+        timeout: float,
+        hedge_after: Optional[float],
+        throttle: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        tasks = [
+            asyncio.ensure_future(
+                execute_search(service, search_params, executor, timeout)
+            )
+        ]
+        try:
+            if hedge_after is not None and hedge_after < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done and executor.can_hedge():
+                    ready = True
+                    if throttle is not None:
+                        waiting = asyncio.ensure_future(throttle())
+                        try:
+                            await asyncio.wait(
+                                [tasks[0], waiting],
+                                return_when=asyncio.FIRST_COMPLETED,
+                            )
+                        finally:
+                            waiting.cancel()
+                        ready = waiting.done() and not waiting.cancelled()
+                    search = None
+                    if ready and not tasks[0].done():
+                        search = submit_search(
+                            service, search_params, executor, timeout, hedge=True
+                        )
+                    if search is not None:
+                        tasks.append(asyncio.ensure_future(search))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+PAGE_SIZE = 10
+MAX_RESULTS = 100
+DATE_RESTRICT_SPANS = {"d": 86400, "w": 7 * 86400, "m": 30 * 86400, "y": 365 * 86400}
+
+
+def result_ttl(date_restrict: Optional[str], base_ttl: int) -> float:
+    if not date_restrict:
+        return base_ttl
+    match = re.fullmatch(r"([dwmy])(\d*)", date_restrict.strip().lower())
+    if match is None:
+        return min(base_ttl, 900)
+    span = DATE_RESTRICT_SPANS[match.group(1)] * int(match.group(2) or 1)
+    return min(base_ttl, span / 96)
+
+
+class ResultCache:
+    FILENAME = "smartserp_results.sqlite3"
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.path: Optional[str] = None
+        self.ready = False
+
+    def configure(self, max_entries: int, directory: str):
+        self.max_entries = max_entries
+        path = os.path.join(directory, self.FILENAME) if directory else None
+        if path != self.path:
+            self.path = path
+            self.ready = False
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def key(search_params: Dict[str, Any]) -> str:
+        params = {k: v for k, v in search_params.items() if k != "key"}
+        params["q"] = re.sub(r"\s+", " ", str(params.get("q", ""))).strip().lower()
+        return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    def connect(self) -> sqlite3.Connection:
+        if not self.ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self.ready:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.commit()
+            self.ready = True
+        return connection
+
+    def load(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        connection = self.connect()
+        try:
+            row = connection.execute(
+                "SELECT value, expires_at FROM results WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        finally:
+            connection.close()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def save(self, key: str, value: Dict[str, Any], expires_at: float):
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO results (key, value, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at),
+                )
+        finally:
+            connection.close()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[1] > time.time():
+                self.entries.move_to_end(key)
+                return entry[0]
+            del self.entries[key]
+        if self.path is None:
+            return None
+        try:
+            entry = await asyncio.to_thread(self.load, key)
+        except (sqlite3.Error, OSError, ValueError):
+            return None
+        if entry is None:
+            return None
+        self.remember(key, *entry)
+        return entry[0]
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float):
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self.remember(key, value, expires_at)
+        if self.path is not None:
+            try:
+                await asyncio.to_thread(self.save, key, value, expires_at)
+            except (sqlite3.Error, OSError):
+                pass
+
+    def remember(self, key: str, value: Dict[str, Any], expires_at: float):
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class QuotaLimiter:
+    def __init__(self):
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def acquire(self, api_key: str, per_minute: int):
+        if per_minute <= 0:
+            return
+        key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        rate = per_minute / 60
+        burst = float(min(per_minute, PAGE_SIZE))
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate) - 1
+        self.buckets[key] = (tokens, now)
+        if tokens < 0:
+            await asyncio.sleep(-tokens / rate)
+
+
+async def iter_pages(
+    service: Any,
+    search_params: Dict[str, Any],
+    n_results: int,
+    executor: SearchExecutor,
+    policy: SearchPolicy,
+    cache: Optional[ResultCache] = None,
+    ttl: float = 0,
+    bypass_cache: bool = False,
+    throttle: Optional[Callable[[], Awaitable[None]]] = None,
+) -> AsyncIterator[Tuple[int, Any, bool]]:
+    async def fetch_page(page_params: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        key = None
+        if cache is not None:
+            key = cache.key(page_params)
+            page = None if bypass_cache else await cache.get(key)
+            if page is not None:
+                return page, True
+        page = await policy.execute(service, page_params, executor, throttle)
+        if key is not None:
+            await cache.set(key, page, ttl)
+        return page, False
+
+    starts = list(range(1, n_results + 1, PAGE_SIZE))
+    tasks = []
+    for start in starts:
+        page_params = dict(search_params, num=min(PAGE_SIZE, n_results - start + 1))
+        if start > 1:
+            page_params["start"] = start
+        tasks.append(asyncio.ensure_future(fetch_page(page_params)))
+    try:
+        for start, task in zip(starts, tasks):
+            try:
+                page, cached = await task
+            except Exception as e:
+                yield start, e, False
+            else:
+                yield start, page, cached
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def fetch_results(
+    service: Any,
+    search_params: Dict[str, Any],
+    n_results: int,
+    executor: SearchExecutor,
+    policy: SearchPolicy,
+    cache: Optional[ResultCache] = None,
+    ttl: float = 0,
+    bypass_cache: bool = False,
+    throttle: Optional[Callable[[], Awaitable[None]]] = None,
+) -> Tuple[List[Dict[str, Any]], List[Tuple[int, Exception]], int]:
+    return await collect_pages(
+        iter_pages(
+            service,
+            search_params,
+            n_results,
+            executor,
+            policy,
+            cache,
+            ttl,
+            bypass_cache,
+            throttle,
+        )
+    )
+
+
+async def collect_pages(
+    pages: AsyncIterator[Tuple[int, Any, bool]],
+) -> Tuple[List[Dict[str, Any]], List[Tuple[int, Exception]], int]:
+    items = []
+    errors = []
+    cached = 0
+    total = 0
+    seen = set()
+    async for start, page, from_cache in pages:
+        total += 1
+        if isinstance(page, Exception):
+            errors.append((start, page))
+            continue
+        cached += from_cache
+        for item in page.get("items", []):
+            link = item.get("link")
+            if link in seen:
+                continue
+            seen.add(link)
+            items.append(item)
+    if errors and len(errors) == total:
+        raise errors[0][1]
+    return items, errors, cached
+
+
+def compile_alternation(patterns: List[str]) -> "re.Pattern":
+    first_chars = sorted({p[2] if p.startswith(r"\b") else p[0] for p in patterns})
+    branches = "|".join(f"(?P<p{i}>{pattern})" for i, pattern in enumerate(patterns))
+    return re.compile(f"(?=[{''.join(first_chars)}])(?:{branches})", re.I)
+
+
+class PromptParser:
+    file_types = [
+        (r"\bpdf\b", "pdf"),
+        (r"\bdocx?\b", "docx"),
+        (r"\bpptx?\b", "pptx"),
+        (r"\bxlsx?\b", "xlsx"),
+        (r"\btxt\b", "txt"),
+        (r"\bcsv\b", "csv"),
+        (r"\bhtml?\b", "html"),
+    ]
+    safe_on = [
+        r"safe\s*search\s*on",
+        r"safe\s*mode",
+        r"filtra contenuti espliciti",
+        r"filter explicit content",
+        r"filtrer contenu explicite",
+        r"contenido explícito",
+        r"filtrar contenido explícito",
+        r"contenuti sicuri",
+        r"contenuto adatto a tutti",
+    ]
+    safe_off = [
+        r"safe\s*search\s*off",
+        r"no safe\s*search",
+        r"no filter explicit content",
+        r"no filtro contenuti espliciti",
+        r"pas de filtre contenu explicite",
+        r"sans filtre contenu explicite",
+        r"sin filtro contenido explícito",
+        r"sin contenido explícito",
+        r"contenuti espliciti",
+    ]
+    content_types = [
+        (r"\bimmagini\b", "image"),
+        (r"\bimages?\b", "image"),
+    ]
+    date_ranges = [
+        (r"ultimi?\s*(\d+)\s*giorni", "d{}"),
+        (r"ultimo\s*mese", "m1"),
+        (r"ultima\s*settimana", "w1"),
+        (r"ultimo\s*anno", "y1"),
+        (r"last\s*(\d+)\s*days", "d{}"),
+        (r"last\s*month", "m1"),
+        (r"last\s*week", "w1"),
+        (r"last\s*year", "y1"),
+        (r"derniers?\s*(\d+)\s*jours", "d{}"),
+        (r"dernier\s*moi[sé]", "m1"),
+        (r"derni[èe]re\s*semaine", "w1"),
+        (r"derni[èe]re\s*ann[ée]e", "y1"),
+        (r"ultimos?\s*(\d+)\s*d[ií]as", "d{}"),
+        (r"ultimo\s*mes", "m1"),
+        (r"ultima\s*semana", "w1"),
+        (r"ultimo\s*a[oó]o", "y1"),
+    ]
+    exclude = [
+        r"\bescludi sito\b",
+        r"\bescludi\b",
+        r"\bexclude site\b",
+        r"\bexclude\b",
+        r"\bexclure site\b",
+        r"\bexclure\b",
+        r"\bexcluir sitio\b",
+        r"\bexcluir\b",
+    ]
+
+    file_type_patterns = [re.compile(p, re.I) for p, _ in file_types]
+    file_type_scan = compile_alternation([p for p, _ in file_types])
+    safe_on_patterns = [re.compile(p, re.I) for p in safe_on]
+    safe_on_scan = compile_alternation(safe_on)
+    safe_off_patterns = [re.compile(p, re.I) for p in safe_off]
+    safe_off_scan = compile_alternation(safe_off)
+    content_type_patterns = [re.compile(p, re.I) for p, _ in content_types]
+    content_type_scan = compile_alternation([p for p, _ in content_types])
+    date_patterns = [re.compile(p, re.I) for p, _ in date_ranges]
+    date_scan = compile_alternation([p for p, _ in date_ranges])
+    site_pattern = re.compile(r"(?=s)\b(sito|site|site web|sitio)\s+([^\s]+)", re.I)
+    exclude_patterns = [re.compile(p, re.I) for p in exclude]
+    exclude_scan = compile_alternation(exclude)
+    whitespace = re.compile(r"\s+")
+
+    @staticmethod
+    def first_match(scan: "re.Pattern", patterns: List["re.Pattern"], text: str):
+        match = scan.search(text)
+        if match is None:
+            return None
+        index = int(match.lastgroup[1:])
+        for i in range(index):
+            if patterns[i].search(text):
+                return i
+        return index
+
+    @staticmethod
+    def remove_all(patterns: List["re.Pattern"], text: str) -> str:
+        for pattern in patterns:
+            text = pattern.sub("", text).strip()
+        return text
+
+    @classmethod
+    def parse(cls, prompt: str) -> Tuple[Dict[str, Any], str]:
+        params = {}
+        text = prompt
+
+        index = cls.first_match(cls.file_type_scan, cls.file_type_patterns, text)
+        if index is not None:
+            params["fileType"] = cls.file_types[index][1]
+            text = cls.file_type_patterns[index].sub("", text).strip()
+
+        if cls.safe_on_scan.search(text):
+            params["safe"] = "high"
+            text = cls.remove_all(cls.safe_on_patterns, text)
+        elif cls.safe_off_scan.search(text):
+            params["safe"] = "off"
+            text = cls.remove_all(cls.safe_off_patterns, text)
+
+        index = cls.first_match(cls.content_type_scan, cls.content_type_patterns, text)
+        if index is not None:
+            params["searchType"] = cls.content_types[index][1]
+            text = cls.content_type_patterns[index].sub("", text).strip()
+
+        index = cls.first_match(cls.date_scan, cls.date_patterns, text)
+        if index is not None:
+            pattern = cls.date_patterns[index]
+            params["dateRestrict"] = cls.date_ranges[index][1].format(
+                *pattern.search(text).groups()
+            )
+            text = pattern.sub("", text).strip()
+
+        match = cls.site_pattern.search(text)
+        if match:
+            params["siteSearch"] = match.group(2)
+            text = cls.site_pattern.sub("", text).strip()
+            if cls.exclude_scan.search(text):
+                params["siteSearchFilter"] = "i"
+                text = cls.remove_all(cls.exclude_patterns, text)
+            else:
+                params["siteSearchFilter"] = "e"
+
+        return params, cls.whitespace.sub(" ", text).strip()
+
+
+MEMO_MAX_LENGTH = 256
+QUERY_WORD = re.compile(r"\b\w+\b")
+
+
+@lru_cache(maxsize=256)
+def build_highlighter(query: str) -> Optional["re.Pattern"]:
+    words = {word.lower(): word for word in QUERY_WORD.findall(query)}
+    if not words:
+        return None
+    alternation = "|".join(re.escape(word) for word in words)
+    return re.compile(rf"\b(?:{alternation})\b", re.I)
+
+
+@lru_cache(maxsize=1024)
+def parse_prompt_cached(prompt: str) -> Tuple[Tuple[Tuple[str, Any], ...], str]:
+    params, cleaned = PromptParser.parse(prompt)
+    return tuple(params.items()), cleaned
+
+
+def parse_prompt(prompt: str) -> Tuple[Dict[str, Any], str]:
+    if len(prompt) > MEMO_MAX_LENGTH:
+        return PromptParser.parse(prompt)
+    params, cleaned = parse_prompt_cached(prompt)
+    return dict(params), cleaned
+
+
+SKIP_TAGS = frozenset(
+    {
+        "script",
+        "style",
+        "nav",
+        "header",
+        "footer",
+        "aside",
+        "noscript",
+        "template",
+        "svg",
+    }
+)
+BLOCK_TAGS = frozenset(
+    {
+        "p",
+        "div",
+        "br",
+        "li",
+        "tr",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "section",
+        "article",
+        "main",
+        "blockquote",
+        "pre",
+        "table",
+    }
+)
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+READ_CHUNK_SIZE = 16384
+
+
+class TextExtractor(HTMLParser):
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.chunks: List[str] = []
+        self.length = 0
+        self.skip_depth = 0
+        self.in_title = False
+        self.title = ""
+
+    @property
+    def full(self) -> bool:
+        return self.length >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == "title":
+            self.in_title = True
+        elif tag in BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == "title":
+            self.in_title = False
+        elif tag in BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+        elif not self.skip_depth and not self.full:
+            self.chunks.append(data)
+            self.length += len(data)
+
+    def text(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self.chunks).splitlines())
+        text = "\n".join(line for line in lines if line)
+        if len(text) > self.max_chars:
+            text = text[: self.max_chars].rsplit(" ", 1)[0] + "…"
+        return text
+
+
+MAX_REDIRECTS = 3
+REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+
+
+def is_public_address(host: str) -> bool:
+    address = ipaddress.ip_address(host.split("%", 1)[0])
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global
+
+
+class PublicResolver(AbstractResolver):
+    # Result pages are fetched from inside the server, so host names that
+    # resolve to loopback, private or link-local addresses are refused.
+    def __init__(self):
+        self.resolver = DefaultResolver()
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> List[Dict[str, Any]]:
+        hosts = [
+            entry
+            for entry in await self.resolver.resolve(host, port, family)
+            if is_public_address(entry["host"])
+        ]
+        if not hosts:
+            raise OSError(0, f"{host} does not resolve to a public address")
+        return hosts
+
+    async def close(self):
+        await self.resolver.close()
+
+
+def blocked_url(url: URL) -> Optional[str]:
+    if url.scheme not in ("http", "https") or not url.host:
+        return "unsupported URL"
+    try:
+        public = is_public_address(url.host)
+    except ValueError:
+        return None
+    return None if public else f"blocked non-public address {url.host}"
+
+
+class PageFetcher:
+    def __init__(self):
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.settings: Optional[tuple] = None
+
+    async def get_session(self, max_connections: int) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        settings = (max_connections,)
+        if (
+            self.session is not None
+            and not self.session.closed
+            and self.loop is loop
+            and self.settings == settings
+        ):
+            return self.session
+        stale = self.session if self.loop is loop else None
+        connector = aiohttp.TCPConnector(
+            limit=max_connections,
+            limit_per_host=2,
+            ttl_dns_cache=300,
+            resolver=PublicResolver(),
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector, headers={"User-Agent": "Mozilla/5.0 (SmartSERP)"}
+        )
+        self.loop = loop
+        self.settings = settings
+        if stale is not None and not stale.closed:
+            await stale.close()
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+async def fetch_page_text(
+    session: aiohttp.ClientSession,
+    url: str,
+    max_bytes: int,
+    max_chars: int,
+    timeout: float,
+) -> Dict[str, Any]:
+    page = {"link": url}
+    if not url.startswith(("http://", "https://")):
+        page["error"] = "unsupported URL"
+        return page
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    target = URL(url)
+    try:
+        for redirects in range(MAX_REDIRECTS + 1):
+            error = blocked_url(target)
+            if error is not None:
+                page["error"] = error
+                return page
+            response = await session.get(
+                target,
+                allow_redirects=False,
+                timeout=aiohttp.ClientTimeout(total=max(0.01, deadline - loop.time())),
+            )
+            if response.status not in REDIRECT_STATUSES:
+                break
+            location = response.headers.get("Location")
+            response.release()
+            if not location:
+                page["error"] = f"HTTP {response.status} without Location"
+                return page
+            target = response.url.join(URL(location))
+        else:
+            page["error"] = f"more than {MAX_REDIRECTS} redirects"
+            return page
+        async with response:
+            if response.status >= 400:
+                page["error"] = f"HTTP {response.status}"
+                return page
+            if not response.content_type.startswith(TEXT_CONTENT_TYPES):
+                page["error"] = f"unsupported content type {response.content_type}"
+                return page
+            try:
+                decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(
+                    errors="replace"
+                )
+            except LookupError:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            extractor = TextExtractor(max_chars)
+            received = 0
+            async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+                chunk = chunk[: max_bytes - received]
+                received += len(chunk)
+                extractor.feed(decoder.decode(chunk))
+                if received >= max_bytes or extractor.full:
+                    break
+            extractor.feed(decoder.decode(b"", final=True))
+    except asyncio.TimeoutError:
+        page["error"] = f"timed out after {timeout}s"
+        return page
+    except (aiohttp.ClientError, ValueError) as e:
+        page["error"] = str(e) or type(e).__name__
+        return page
+    page["title"] = " ".join(extractor.title.split())
+    page["excerpt"] = extractor.text()
+    page["bytes"] = received
+    return page
+
+
+async def fetch_excerpts(
+    session: aiohttp.ClientSession,
+    urls: List[str],
+    max_bytes: int,
+    max_chars: int,
+    timeout: float,
+) -> List[Dict[str, Any]]:
+    return await asyncio.gather(
+        *(fetch_page_text(session, url, max_bytes, max_chars, timeout) for url in urls)
+    )
+
+
+def resolve_settings(valves: Any, user_valves: Any) -> Dict[str, Any]:
+    return {
+        "api_key": user_valves.google_api_key or valves.google_api_key,
+        "cse_id": user_valves.custom_search_engine_id or valves.custom_search_engine_id,
+        "max_results": (
+            user_valves.max_results
+            if user_valves.max_results is not None
+            else valves.max_results
+        ),
+        "language": user_valves.language or valves.language,
+        "date_restrict": (
+            user_valves.date_restrict
+            if user_valves.date_restrict is not None
+            else valves.date_restrict
+        ),
+    }
+
+
+def build_search_params(
+    query: str, prompt: Optional[str], settings: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    extra_params, core_query = parse_prompt(prompt if prompt else query)
+
+    file_type = extra_params.pop("fileType", None)
+    if file_type:
+        core_query += f" filetype:{file_type}"
+
+    final_query = core_query.strip() if core_query.strip() else query.strip()
+    final_query = re.sub(r"\s+filetype:\w+", "", final_query, flags=re.I).strip()
+    if file_type and f"filetype:{file_type}" not in final_query:
+        final_query += f" filetype:{file_type}"
+
+    search_params = {
+        "q": final_query,
+        "cx": settings["cse_id"],
+    }
+    if settings["language"]:
+        search_params["lr"] = f"lang_{settings['language'].lower()}"
+    if "dateRestrict" not in extra_params and settings["date_restrict"]:
+        search_params["dateRestrict"] = settings["date_restrict"]
+
+    for k, v in extra_params.items():
+        if k == "searchType":
+            if v == "image":
+                search_params[k] = v
+        else:
+            search_params[k] = v
+    return search_params, extra_params
+
+
+def stream_pages(
+    tools: "Tools",
+    api_key: str,
+    search_params: Dict[str, Any],
+    n_results: int,
+    bypass_cache: bool = False,
+) -> AsyncIterator[Tuple[int, Any, bool]]:
+    valves = tools.valves
+    tools.policy.configure(valves)
+    tools.services.max_size = valves.service_cache_size
+    service = tools.services.get(api_key, valves.static_discovery)
+    tools.executor.configure(valves.max_concurrent_searches)
+    cache = None
+    if valves.cache_enabled:
+        cache = tools.results
+        cache.configure(valves.cache_max_entries, valves.cache_dir)
+    return iter_pages(
+        service,
+        search_params,
+        n_results,
+        tools.executor,
+        tools.policy,
+        cache,
+        result_ttl(search_params.get("dateRestrict"), valves.cache_ttl),
+        bypass_cache,
+        partial(tools.quota.acquire, api_key, valves.queries_per_minute),
+    )
+
+
+async def search_pages(
+    tools: "Tools",
+    api_key: str,
+    search_params: Dict[str, Any],
+    n_results: int,
+    bypass_cache: bool = False,
+) -> Tuple[List[Dict[str, Any]], List[Tuple[int, Exception]], int]:
+    return await collect_pages(
+        stream_pages(tools, api_key, search_params, n_results, bypass_cache)
+    )
+
+
+OUTPUT_FORMATS = ("markdown", "json", "json_compact", "ndjson")
+COMPACT_SEPARATORS = (",", ":")
+
+
+def parse_pagemap_keys(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    if value is None or value.strip() == "*":
+        return None
+    return tuple(key.strip() for key in value.split(",") if key.strip())
+
+
+def result_record(
+    item: Dict[str, Any], pagemap_keys: Optional[Tuple[str, ...]] = None
+) -> Dict[str, Any]:
+    record = {
+        "title": item.get("title", ""),
+        "link": item.get("link", ""),
+        "snippet": item.get("snippet", ""),
+        "displayLink": item.get("displayLink", ""),
+        "formattedUrl": item.get("formattedUrl", ""),
+    }
+    pagemap = item.get("pagemap", {})
+    if pagemap_keys is None:
+        record["pagemap"] = pagemap
+    elif pagemap_keys:
+        record["pagemap"] = {k: v for k, v in pagemap.items() if k in pagemap_keys}
+    return record
+
+
+def dump_json(value: Any, output_format: str) -> str:
+    if output_format == "json":
+        return json.dumps(value, indent=2, ensure_ascii=False)
+    return json.dumps(value, separators=COMPACT_SEPARATORS, ensure_ascii=False)
+
+
+async def serialize_pages(
+    pages: AsyncIterator[Tuple[int, Any, bool]],
+    pagemap_keys: Optional[Tuple[str, ...]] = None,
+) -> Tuple[List[str], List[str], List[Tuple[int, Exception]], int]:
+    lines = []
+    links = []
+    errors = []
+    cached = 0
+    total = 0
+    seen = set()
+    async for start, page, from_cache in pages:
+        total += 1
+        if isinstance(page, Exception):
+            errors.append((start, page))
+            lines.append(
+                json.dumps(
+                    {"start": start, "error": str(page)},
+                    separators=COMPACT_SEPARATORS,
+                    ensure_ascii=False,
+                )
+            )
+            continue
+        cached += from_cache
+        for item in page.get("items", []):
+            link = item.get("link")
+            if link in seen:
+                continue
+            seen.add(link)
+            links.append(link)
+            record = dict(rank=len(links), **result_record(item, pagemap_keys))
+            lines.append(
+                json.dumps(record, separators=COMPACT_SEPARATORS, ensure_ascii=False)
+            )
+    if errors and len(errors) == total:
+        raise errors[0][1]
+    return lines, links, errors, cached
+
+
+def clean_text(text: str) -> str:
+    return text.replace("{", "").replace("}", "")
+
+
+URL_TABLE_SIZE = 25
+
+
+def url_frequency(searches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    urls: Dict[str, Dict[str, Any]] = {}
+    for search in searches:
+        for position, item in enumerate(search.get("items", []), 1):
+            link = item.get("link")
+            if not link:
+                continue
+            entry = urls.setdefault(
+                link,
+                {"url": link, "count": 0, "best_position": position, "queries": []},
+            )
+            if search["query"] in entry["queries"]:
+                continue
+            entry["count"] += 1
+            entry["best_position"] = min(entry["best_position"], position)
+            entry["queries"].append(search["query"])
+    ranked = sorted(urls.values(), key=lambda e: (-e["count"], e["best_position"]))
+    return ranked[:URL_TABLE_SIZE]
+
+
 class Tools:
     class Valves(BaseModel):
         google_api_key: str = Field("", description="Google API key")
         custom_search_engine_id: str = Field("", description="Custom Search Engine ID")
-        max_results: int = Field(10, ge=1, le=10, description="Max results (1-10)")
+        max_results: int = Field(
+            10, ge=1, le=MAX_RESULTS, description="Max results (1-100)"
+        )
         language: Optional[str] = Field(
             "en", min_length=2, max_length=5, description="Language code"
         )
         date_restrict: Optional[str] = Field(
             None, description="Date restriction (d1,w1,m1,y1)"
         )
+        service_cache_size: int = Field(
+            32,
+            ge=1,
+            description="Max number of cached search clients (one per API key)",
+        )
+        static_discovery: bool = Field(
+            True,
+            description="Use the bundled discovery document instead of fetching it",
+        )
+        max_concurrent_searches: int = Field(
+            8, ge=1, le=64, description="Max searches running at the same time"
+        )
+        request_timeout: float = Field(
+            15.0, gt=0, description="Timeout in seconds for a single search request"
+        )
+        adaptive_timeout: bool = Field(
+            True,
+            description="Shorten the request timeout to a multiple of the observed p99 latency",
+        )
+        max_retries: int = Field(
+            2,
+            ge=0,
+            le=5,
+            description="Retries on rate limiting, server errors and timeouts",
+        )
+        backoff_base: float = Field(
+            0.5, gt=0, description="Base delay in seconds between retries"
+        )
+        backoff_max: float = Field(
+            8.0, gt=0, description="Max delay in seconds between retries"
+        )
+        hedge_requests: bool = Field(
+            False,
+            description="Send a second request when the first is slower than the observed p95 latency and a search worker is free",
+        )
+        cache_enabled: bool = Field(True, description="Cache search results")
+        cache_ttl: int = Field(
+            86400,
+            ge=0,
+            description="Cache lifetime in seconds without date restriction (shorter for d/w/m)",
+        )
+        cache_max_entries: int = Field(
+            512, ge=1, description="Max number of result pages kept in memory"
+        )
+        cache_dir: str = Field(
+            "", description="Directory for persistent result cache (empty disables it)"
+        )
+        queries_per_minute: int = Field(
+            100,
+            ge=0,
+            description="Max search requests per minute for each API key (0 disables it)",
+        )
+        batch_concurrency: int = Field(
+            4,
+            ge=1,
+            le=32,
+            description="Max queries of a batch searched at the same time",
+        )
+        batch_max_queries: int = Field(
+            50, ge=1, description="Max number of queries accepted in a single batch"
+        )
+        deep_results: int = Field(
+            3, ge=1, le=10, description="Number of top results read by deep search"
+        )
+        deep_max_connections: int = Field(
+            8, ge=1, le=32, description="Max open connections for deep search"
+        )
+        deep_max_bytes: int = Field(
+            262144, ge=1024, description="Max bytes downloaded from each result page"
+        )
+        deep_max_chars: int = Field(
+            1500,
+            ge=100,
+            description="Max characters of text kept from each result page",
+        )
+        deep_timeout: float = Field(
+            10.0, gt=0, description="Timeout in seconds for reading a result page"
+        )
+        pagemap_keys: str = Field(
+            "*",
+            description="Comma-separated pagemap keys kept in JSON output (* keeps all, empty drops pagemap)",
+        )
 
     class UserValves(BaseModel):
         google_api_key: str = Field("", description="User Google API key")
@@ -61,7 +1283,7 @@ class Tools:
             "", description="User Custom Search Engine ID"
         )
         max_results: Optional[int] = Field(
-            None, ge=1, le=10, description="Max results user"
+            None, ge=1, le=MAX_RESULTS, description="Max results user"
         )
         language: Optional[str] = Field(
             None, min_length=2, max_length=5, description="Language code user"
@@ -77,8 +1299,16 @@ class Tools:
             "error_cse_id": "Custom Search Engine ID is not configured.",
             "search_start": "Starting search on Google...",
             "search_success": "Search completed successfully.",
+            "search_cached": "Served {cached} of {total} result pages from cache.",
+            "search_partial": "Some result pages could not be retrieved ({failed} of {total}).",
+            "deep_start": "Reading the top {count} results...",
             "search_no_items": "No results found.",
             "separator": "---\n",
+            "batch_results": "# Batch search results for {count} queries\n",
+            "batch_progress": "Completed {done} of {total} searches.",
+            "batch_skipped": "Batch limit of {limit} queries reached, {count} queries skipped.",
+            "skipped_queries": "## Skipped queries (over the batch limit of {limit})\n",
+            "url_frequency": "## URL frequency across queries\n",
         },
         "it": {
             "results_for": "## Risultati ricerca per: *{query}*\n",
@@ -88,8 +1318,16 @@ class Tools:
             "error_cse_id": "L'ID Custom Search Engine non è configurato.",
             "search_start": "Avvio ricerca su Google...",
             "search_success": "Ricerca completata con successo.",
+            "search_cached": "{cached} pagine di risultati su {total} servite dalla cache.",
+            "search_partial": "Alcune pagine di risultati non sono state recuperate ({failed} su {total}).",
+            "deep_start": "Lettura dei primi {count} risultati...",
             "search_no_items": "Nessun risultato trovato.",
             "separator": "---\n",
+            "batch_results": "# Risultati ricerca multipla per {count} query\n",
+            "batch_progress": "Completate {done} ricerche su {total}.",
+            "batch_skipped": "Limite di {limit} query per ricerca multipla raggiunto, {count} query saltate.",
+            "skipped_queries": "## Query saltate (oltre il limite di {limit})\n",
+            "url_frequency": "## Frequenza degli URL tra le query\n",
         },
         "fr": {
             "results_for": "## Résultats de recherche pour : *{query}*\n",
@@ -99,8 +1337,16 @@ class Tools:
             "error_cse_id": "L'ID du moteur de recherche personnalisé n'est pas configuré.",
             "search_start": "Démarrage de la recherche sur Google...",
             "search_success": "Recherche terminée avec succès.",
+            "search_cached": "{cached} pages de résultats sur {total} servies depuis le cache.",
+            "search_partial": "Certaines pages de résultats n'ont pas pu être récupérées ({failed} sur {total}).",
+            "deep_start": "Lecture des {count} premiers résultats...",
             "search_no_items": "Aucun résultat trouvé.",
             "separator": "---\n",
+            "batch_results": "# Résultats de recherche groupée pour {count} requêtes\n",
+            "batch_progress": "{done} recherches terminées sur {total}.",
+            "batch_skipped": "Limite de {limit} requêtes par lot atteinte, {count} requêtes ignorées.",
+            "skipped_queries": "## Requêtes ignorées (au-delà de la limite de {limit})\n",
+            "url_frequency": "## Fréquence des URL entre les requêtes\n",
         },
         "es": {
             "results_for": "## Resultados de búsqueda para: *{query}*\n",
@@ -110,126 +1356,30 @@ class Tools:
             "error_cse_id": "El ID del motor de búsqueda personalizado no está configurado.",
             "search_start": "Iniciando búsqueda en Google...",
             "search_success": "Búsqueda completada con éxito.",
+            "search_cached": "{cached} de {total} páginas de resultados servidas desde la caché.",
+            "search_partial": "Algunas páginas de resultados no se pudieron obtener ({failed} de {total}).",
+            "deep_start": "Leyendo los {count} primeros resultados...",
             "search_no_items": "No se encontraron resultados.",
             "separator": "---\n",
+            "batch_results": "# Resultados de búsqueda múltiple para {count} consultas\n",
+            "batch_progress": "Completadas {done} de {total} búsquedas.",
+            "batch_skipped": "Límite de {limit} consultas por lote alcanzado, {count} consultas omitidas.",
+            "skipped_queries": "## Consultas omitidas (por encima del límite de {limit})\n",
+            "url_frequency": "## Frecuencia de URL entre consultas\n",
         },
     }
 
     def __init__(self):
         self.valves = self.Valves()
+        self.services = ServiceCache()
+        self.executor = SearchExecutor()
+        self.results = ResultCache()
+        self.quota = QuotaLimiter()
+        self.pages = PageFetcher()
+        self.policy = SearchPolicy()
 
     def parse_extra_params_from_prompt(self, prompt: str) -> Tuple[Dict[str, Any], str]:
-        params = {}
-        cleaned_prompt = prompt
-
-        def remove_pattern(text, pattern):
-            return re.sub(pattern, "", text, flags=re.I).strip()
-
-        file_type_patterns = {
-            r"\bpdf\b": "pdf",
-            r"\bdocx?\b": "docx",
-            r"\bpptx?\b": "pptx",
-            r"\bxlsx?\b": "xlsx",
-            r"\btxt\b": "txt",
-            r"\bcsv\b": "csv",
-            r"\bhtml?\b": "html",
-        }
-        for pat, val in file_type_patterns.items():
-            if re.search(pat, cleaned_prompt, re.I):
-                params["fileType"] = val
-                cleaned_prompt = remove_pattern(cleaned_prompt, pat)
-                break
-
-        safe_on = [
-            r"safe\s*search\s*on",
-            r"safe\s*mode",
-            r"filtra contenuti espliciti",
-            r"filter explicit content",
-            r"filtrer contenu explicite",
-            r"contenido explícito",
-            r"filtrar contenido explícito",
-            r"contenuti sicuri",
-            r"contenuto adatto a tutti",
-        ]
-        safe_off = [
-            r"safe\s*search\s*off",
-            r"no safe\s*search",
-            r"no filter explicit content",
-            r"no filtro contenuti espliciti",
-            r"pas de filtre contenu explicite",
-            r"sans filtre contenu explicite",
-            r"sin filtro contenido explícito",
-            r"sin contenido explícito",
-            r"contenuti espliciti",
-        ]
-        if any(re.search(p, cleaned_prompt, re.I) for p in safe_on):
-            params["safe"] = "high"
-            for p in safe_on:
-                cleaned_prompt = remove_pattern(cleaned_prompt, p)
-        elif any(re.search(p, cleaned_prompt, re.I) for p in safe_off):
-            params["safe"] = "off"
-            for p in safe_off:
-                cleaned_prompt = remove_pattern(cleaned_prompt, p)
-
-        content_types = {
-            r"\bimmagini\b": "image",
-            r"\bimages?\b": "image",
-        }
-        for pat, val in content_types.items():
-            if re.search(pat, cleaned_prompt, re.I):
-                params["searchType"] = val
-                cleaned_prompt = remove_pattern(cleaned_prompt, pat)
-                break
-
-        date_patterns = {
-            r"ultimi?\s*(\d+)\s*giorni": lambda m: f"d{m.group(1)}",
-            r"ultimo\s*mese": lambda m: "m1",
-            r"ultima\s*settimana": lambda m: "w1",
-            r"ultimo\s*anno": lambda m: "y1",
-            r"last\s*(\d+)\s*days": lambda m: f"d{m.group(1)}",
-            r"last\s*month": lambda m: "m1",
-            r"last\s*week": lambda m: "w1",
-            r"last\s*year": lambda m: "y1",
-            r"derniers?\s*(\d+)\s*jours": lambda m: f"d{m.group(1)}",
-            r"dernier\s*moi[sé]": lambda m: "m1",
-            r"derni[èe]re\s*semaine": lambda m: "w1",
-            r"derni[èe]re\s*ann[ée]e": lambda m: "y1",
-            r"ultimos?\s*(\d+)\s*d[ií]as": lambda m: f"d{m.group(1)}",
-            r"ultimo\s*mes": lambda m: "m1",
-            r"ultima\s*semana": lambda m: "w1",
-            r"ultimo\s*a[oó]o": lambda m: "y1",
-        }
-        for pat, func in date_patterns.items():
-            m = re.search(pat, cleaned_prompt, re.I)
-            if m:
-                params["dateRestrict"] = func(m)
-                cleaned_prompt = remove_pattern(cleaned_prompt, pat)
-                break
-
-        site_pat = r"\b(sito|site|site web|sitio)\s+([^\s]+)"
-        m = re.search(site_pat, cleaned_prompt, re.I)
-        if m:
-            params["siteSearch"] = m.group(2)
-            cleaned_prompt = remove_pattern(cleaned_prompt, site_pat)
-            exclude_pat = [
-                r"\bescludi sito\b",
-                r"\bescludi\b",
-                r"\bexclude site\b",
-                r"\bexclude\b",
-                r"\bexclure site\b",
-                r"\bexclure\b",
-                r"\bexcluir sitio\b",
-                r"\bexcluir\b",
-            ]
-            if any(re.search(p, cleaned_prompt, re.I) for p in exclude_pat):
-                params["siteSearchFilter"] = "i"
-                for p in exclude_pat:
-                    cleaned_prompt = remove_pattern(cleaned_prompt, p)
-            else:
-                params["siteSearchFilter"] = "e"
-
-        cleaned_prompt = re.sub(r"\s+", " ", cleaned_prompt).strip()
-        return params, cleaned_prompt
+        return parse_prompt(prompt)
 
     async def run(
         self,
@@ -237,148 +1387,456 @@ class Tools:
         num_results: Optional[int] = None,
         prompt: Optional[str] = None,
         output_format: str = "markdown",
+        bypass_cache: bool = False,
+        deep: bool = False,
         __event_emitter__: Callable[[dict], Any] = None,
         __user__: Dict[str, Any] = {},
     ) -> str:
         emitter = EventEmitter(__event_emitter__)
-        lang = (
-            __user__.get("valves", {}).language or self.valves.language or "en"
-        ).lower()
+        settings = resolve_settings(
+            self.valves, __user__.get("valves") or self.UserValves()
+        )
+        lang = (settings["language"] or "en").lower()
         t = self.translations.get(lang, self.translations["en"])
 
         if not query or not query.strip():
             await emitter.error_update(t["error_empty_query"])
             return f"Error: {t['error_empty_query']}"
 
-        if "valves" not in __user__:
-            __user__["valves"] = self.UserValves()
-
-        api_key = (
-            __user__["valves"].google_api_key
-            if __user__["valves"].google_api_key
-            else self.valves.google_api_key
-        )
-        cse_id = (
-            __user__["valves"].custom_search_engine_id
-            if __user__["valves"].custom_search_engine_id
-            else self.valves.custom_search_engine_id
-        )
-        max_res = (
-            __user__["valves"].max_results
-            if __user__["valves"].max_results is not None
-            else self.valves.max_results
-        )
-        language = (
-            __user__["valves"].language
-            if __user__["valves"].language
-            else self.valves.language
-        )
-        date_restrict = (
-            __user__["valves"].date_restrict
-            if __user__["valves"].date_restrict is not None
-            else self.valves.date_restrict
+        n_results = max(
+            1,
+            min(
+                num_results if num_results is not None else settings["max_results"],
+                MAX_RESULTS,
+            ),
         )
-        n_results = min(num_results if num_results is not None else max_res, 10)
 
-        if not api_key:
+        if not settings["api_key"]:
             await emitter.error_update(t["error_api_key"])
             return f"Error: {t['error_api_key']}"
-        if not cse_id:
+        if not settings["cse_id"]:
             await emitter.error_update(t["error_cse_id"])
             return f"Error: {t['error_cse_id']}"
 
-        extra_params = {}
-        base_prompt = prompt if prompt else query
-        extra_params, core_query = self.parse_extra_params_from_prompt(base_prompt)
+        search_params, extra_params = build_search_params(query, prompt, settings)
+        final_query = search_params["q"]
 
-        file_type = extra_params.pop("fileType", None)
-        if file_type:
-            core_query += f" filetype:{file_type}"
-
-        final_query = core_query.strip() if core_query.strip() else query.strip()
-        final_query = re.sub(r"\s+filetype:\w+", "", final_query, flags=re.I).strip()
-        if file_type and f"filetype:{file_type}" not in final_query:
-            final_query += f" filetype:{file_type}"
+        pagemap_keys = parse_pagemap_keys(self.valves.pagemap_keys)
 
         try:
             await emitter.progress_update(t["search_start"])
-            service = build("customsearch", "v1", developerKey=api_key)
-            search_params = {
-                "q": final_query,
-                "cx": cse_id,
-                "num": n_results,
-            }
-            if language:
-                search_params["lr"] = f"lang_{language.lower()}"
-            if "dateRestrict" not in extra_params and date_restrict:
-                search_params["dateRestrict"] = date_restrict
-
-            for k, v in extra_params.items():
-                if k == "searchType":
-                    if v == "image":
-                        search_params[k] = v
-                else:
-                    search_params[k] = v
-
-            res = service.cse().list(**search_params).execute()
-
-            if "items" not in res:
+            if output_format == "ndjson":
+                lines, links, errors, cached = await serialize_pages(
+                    stream_pages(
+                        self,
+                        settings["api_key"],
+                        search_params,
+                        n_results,
+                        bypass_cache,
+                    ),
+                    pagemap_keys,
+                )
+            else:
+                items, errors, cached = await search_pages(
+                    self, settings["api_key"], search_params, n_results, bypass_cache
+                )
+                links = [item.get("link", "") for item in items]
+            if cached:
+                await emitter.progress_update(
+                    t["search_cached"].format(
+                        cached=cached, total=-(-n_results // PAGE_SIZE)
+                    )
+                )
+
+            if not links:
                 await emitter.success_update(t["search_no_items"])
                 return t["no_results"]
 
-            if output_format == "json":
-                import json
-
-                results = [
-                    {
-                        "title": item.get("title", ""),
-                        "link": item.get("link", ""),
-                        "snippet": item.get("snippet", ""),
-                        "displayLink": item.get("displayLink", ""),
-                        "formattedUrl": item.get("formattedUrl", ""),
-                        "pagemap": item.get("pagemap", {}),
-                    }
-                    for item in res["items"]
-                ]
+            if errors:
+                await emitter.progress_update(
+                    t["search_partial"].format(
+                        failed=len(errors), total=-(-n_results // PAGE_SIZE)
+                    )
+                )
+
+            excerpts = {}
+            if deep:
+                top = links[: self.valves.deep_results]
+                await emitter.progress_update(t["deep_start"].format(count=len(top)))
+                pages = await fetch_excerpts(
+                    await self.pages.get_session(self.valves.deep_max_connections),
+                    top,
+                    self.valves.deep_max_bytes,
+                    self.valves.deep_max_chars,
+                    self.valves.deep_timeout,
+                )
+                excerpts = {page["link"]: page for page in pages}
+
+            if output_format == "ndjson":
+                for rank, link in enumerate(links, 1):
+                    if link in excerpts:
+                        lines.append(
+                            dump_json(dict(rank=rank, **excerpts[link]), output_format)
+                        )
+                await emitter.success_update(t["search_success"])
+                return "\n".join(lines)
+            elif output_format in ("json", "json_compact"):
+                results = [result_record(item, pagemap_keys) for item in items]
+                for result in results:
+                    page = excerpts.get(result["link"])
+                    if page is not None:
+                        if "error" in page:
+                            result["excerpt_error"] = page["error"]
+                        else:
+                            result["excerpt"] = page["excerpt"]
                 summary = {
                     "query": final_query,
                     "num_results": len(results),
-                    "language": language,
+                    "language": settings["language"],
                     "filters": extra_params,
                     "results": results,
                 }
+                if errors:
+                    summary["failed_pages"] = [
+                        {"start": start, "error": str(error)} for start, error in errors
+                    ]
                 await emitter.success_update(t["search_success"])
-                return json.dumps(summary, indent=2, ensure_ascii=False)
+                return dump_json(summary, output_format)
             else:
-
-                def highlight(text, query):
-                    words = re.findall(r"\b\w+\b", query)
-                    for w in words:
-                        text = re.sub(
-                            r"\b" + re.escape(w) + r"\b", f"**{w}**", text, flags=re.I
-                        )
-                    return text
-
+                highlighter = build_highlighter(query)
                 output_lines = [t["results_for"].format(query=final_query)]
 
-                for i, item in enumerate(res["items"], 1):
-                    title = (
-                        item.get("title", "No title").replace("{", "").replace("}", "")
-                    )
+                for i, item in enumerate(items, 1):
+                    title = clean_text(item.get("title", "No title"))
                     link = item.get("link", "No link")
-                    snippet = item.get("snippet", "").replace("{", "").replace("}", "")
-                    snippet = highlight(snippet, query)
+                    snippet = clean_text(item.get("snippet", ""))
+                    if highlighter is not None:
+                        snippet = highlighter.sub(r"**\g<0>**", snippet)
 
                     output_lines.append(f"### Result {i}")
                     output_lines.append(f"[{title}]({link})")
                     output_lines.append(f"{snippet}")
+                    if excerpts.get(link, {}).get("excerpt"):
+                        excerpt = clean_text(excerpts[link]["excerpt"])
+                        output_lines.append("> " + excerpt.replace("\n", "\n> "))
                     output_lines.append(f"{link}")
                     output_lines.append(t["separator"])
 
                 await emitter.success_update(t["search_success"])
                 return "\n".join(output_lines)
 
+        except asyncio.TimeoutError:
+            error_msg = (
+                f"Error during search: timed out after {self.valves.request_timeout}s"
+            )
+            await emitter.error_update(error_msg)
+            return error_msg
         except Exception as e:
             error_msg = f"Error during search: {str(e)}"
             await emitter.error_update(error_msg)
             return error_msg
+
+    async def run_batch(
+        self,
+        queries: List[str],
+        num_results: Optional[int] = None,
+        output_format: str = "markdown",
+        bypass_cache: bool = False,
+        __event_emitter__: Callable[[dict], Any] = None,
+        __user__: Dict[str, Any] = {},
+    ) -> str:
+        emitter = EventEmitter(__event_emitter__)
+        settings = resolve_settings(
+            self.valves, __user__.get("valves") or self.UserValves()
+        )
+        lang = (settings["language"] or "en").lower()
+        t = self.translations.get(lang, self.translations["en"])
+
+        queries = [q.strip() for q in queries or [] if q and q.strip()]
+        if not queries:
+            await emitter.error_update(t["error_empty_query"])
+            return f"Error: {t['error_empty_query']}"
+        if not settings["api_key"]:
+            await emitter.error_update(t["error_api_key"])
+            return f"Error: {t['error_api_key']}"
+        if not settings["cse_id"]:
+            await emitter.error_update(t["error_cse_id"])
+            return f"Error: {t['error_cse_id']}"
+
+        n_results = max(
+            1,
+            min(
+                num_results if num_results is not None else settings["max_results"],
+                MAX_RESULTS,
+            ),
+        )
+        limit = self.valves.batch_max_queries
+        unique: "OrderedDict[str, str]" = OrderedDict()
+        accepted, skipped = [], []
+        for query in queries:
+            key = " ".join(query.split()).lower()
+            if key not in unique and len(unique) >= limit:
+                skipped.append(query)
+                continue
+            unique.setdefault(key, query)
+            accepted.append(query)
+        queries = accepted
+        if skipped:
+            await emitter.progress_update(
+                t["batch_skipped"].format(limit=limit, count=len(skipped))
+            )
+        semaphore = asyncio.Semaphore(self.valves.batch_concurrency)
+        done = 0
+
+        async def search_one(query: str) -> Dict[str, Any]:
+            nonlocal done
+            search_params, _ = build_search_params(query, None, settings)
+            search = {"query": query, "final_query": search_params["q"], "items": []}
+            async with semaphore:
+                try:
+                    items, errors, _ = await search_pages(
+                        self,
+                        settings["api_key"],
+                        search_params,
+                        n_results,
+                        bypass_cache,
+                    )
+                    search["items"] = items
+                    search["errors"] = errors
+                except asyncio.TimeoutError:
+                    search["error"] = f"timed out after {self.valves.request_timeout}s"
+                except Exception as e:
+                    search["error"] = str(e)
+            done += 1
+            await emitter.progress_update(
+                t["batch_progress"].format(done=done, total=len(unique))
+            )
+            return search
+
+        await emitter.progress_update(t["search_start"])
+        results = await asyncio.gather(*(search_one(q) for q in unique.values()))
+        searches = dict(zip(unique, results))
+        ordered = [searches[" ".join(q.split()).lower()] for q in queries]
+        frequency = url_frequency(list(searches.values()))
+        pagemap_keys = parse_pagemap_keys(self.valves.pagemap_keys)
+
+        if output_format == "ndjson":
+            lines = []
+            for search in ordered:
+                for rank, item in enumerate(search["items"], 1):
+                    record = dict(
+                        query=search["query"],
+                        rank=rank,
+                        **result_record(item, pagemap_keys),
+                    )
+                    lines.append(dump_json(record, output_format))
+                for start, error in search.get("errors", []):
+                    lines.append(
+                        dump_json(
+                            {
+                                "query": search["query"],
+                                "start": start,
+                                "error": str(error),
+                            },
+                            output_format,
+                        )
+                    )
+                if "error" in search:
+                    lines.append(
+                        dump_json(
+                            {"query": search["query"], "error": search["error"]},
+                            output_format,
+                        )
+                    )
+            if skipped:
+                lines.append(dump_json({"skipped_queries": skipped}, output_format))
+            lines.append(dump_json({"url_frequency": frequency}, output_format))
+            await emitter.success_update(t["search_success"])
+            return "\n".join(lines)
+
+        if output_format in ("json", "json_compact"):
+            summary = {"queries": [], "url_frequency": frequency}
+            for search in ordered:
+                record = {
+                    "query": search["query"],
+                    "final_query": search["final_query"],
+                    "num_results": len(search["items"]),
+                    "results": [
+                        result_record(item, pagemap_keys) for item in search["items"]
+                    ],
+                }
+                if search.get("errors"):
+                    record["failed_pages"] = [
+                        {"start": start, "error": str(error)}
+                        for start, error in search["errors"]
+                    ]
+                if "error" in search:
+                    record["error"] = search["error"]
+                summary["queries"].append(record)
+            if skipped:
+                summary["skipped_queries"] = skipped
+            await emitter.success_update(t["search_success"])
+            return dump_json(summary, output_format)
+
+        output_lines = [t["batch_results"].format(count=len(ordered))]
+        for search in ordered:
+            output_lines.append(t["results_for"].format(query=search["final_query"]))
+            if "error" in search:
+                output_lines.append(f"Error during search: {search['error']}\n")
+                continue
+            if not search["items"]:
+                output_lines.append(t["no_results"] + "\n")
+                continue
+            highlighter = build_highlighter(search["query"])
+            for i, item in enumerate(search["items"], 1):
+                title = clean_text(item.get("title", "No title"))
+                snippet = clean_text(item.get("snippet", ""))
+                if highlighter is not None:
+                    snippet = highlighter.sub(r"**\g<0>**", snippet)
+                output_lines.append(f"{i}. [{title}]({item.get('link', '')}) {snippet}")
+            output_lines.append("")
+
+        if skipped:
+            output_lines.append(t["skipped_queries"].format(limit=limit))
+            output_lines.extend(f"- {query}" for query in skipped)
+            output_lines.append("")
+        output_lines.append(t["url_frequency"])
+        output_lines.append("| URL | Queries | Best position |")
+        output_lines.append("| --- | --- | --- |")
+        for entry in frequency:
+            output_lines.append(
+                f"| {entry['url']} | {entry['count']} | {entry['best_position']} |"
+            )
+        await emitter.success_update(t["search_success"])
+        return "\n".join(output_lines)
+
+
+EXAMPLE_PROMPTS = [
+    'Search for "artificial intelligence" with safe search on.',
+    'Find PDF files about "climate change".',
+    'Show results only from site "example.com".',
+    'Exclude site "fake-news.com" in search for "green technology".',
+    "Find images of cute cats with safe search off.",
+    'Latest news about "space exploration" published last month.',
+    'Cerca articoli su "energia rinnovabile" con SafeSearch attivo.',
+    'Trova file PDF riguardanti "cambiamenti climatici".',
+    "Mostrami risultati solo dal sito example.com.",
+    'Escludi il sito "notiziefalse.com" nelle ricerche su "tecnologie verdi".',
+    "Cerca immagini di gatti divertenti senza filtro contenuti espliciti.",
+    'Notizie dal sito "ansa.it" sugli eventi politici dell\'ultima settimana.',
+    'Recherche des articles sur "énergie renouvelable" avec SafeSearch activé.',
+    'Trouve des fichiers PDF concernant le "changement climatique".',
+    "Montre les résultats uniquement du site example.com.",
+    'Exclure le site "faussesinfos.com" pour la recherche sur "technologies vertes".',
+    "Cherche des images de chats mignons sans filtre contenu explicite.",
+    'Nouvelles sur "exploration spatiale" de la dernière semaine.',
+    'Busca artículos sobre "energía renovable" con SafeSearch activado.',
+    'Encuentra archivos PDF sobre "cambio climático".',
+    'Muestra resultados solo del sitio "ejemplo.com".',
+    'Excluir el sitio "noticiasfalsas.com" en la búsqueda de "tecnologías verdes".',
+    "Busca imágenes de gatos divertidos sin filtro contenido explícito.",
+    'Noticias sobre "exploración espacial" de los ultimos 7 días.',
+]
+
+
+def parse_prompt_sequential(prompt: str) -> Tuple[Dict[str, Any], str]:
+    # Reference copy of the original parser: every pattern is searched and
+    # removed with re.search/re.sub in table order, as before precompilation.
+    def remove_pattern(text, pattern):
+        return re.sub(pattern, "", text, flags=re.I).strip()
+
+    params = {}
+    cleaned_prompt = prompt
+    for pat, val in PromptParser.file_types:
+        if re.search(pat, cleaned_prompt, re.I):
+            params["fileType"] = val
+            cleaned_prompt = remove_pattern(cleaned_prompt, pat)
+            break
+    if any(re.search(p, cleaned_prompt, re.I) for p in PromptParser.safe_on):
+        params["safe"] = "high"
+        for p in PromptParser.safe_on:
+            cleaned_prompt = remove_pattern(cleaned_prompt, p)
+    elif any(re.search(p, cleaned_prompt, re.I) for p in PromptParser.safe_off):
+        params["safe"] = "off"
+        for p in PromptParser.safe_off:
+            cleaned_prompt = remove_pattern(cleaned_prompt, p)
+    for pat, val in PromptParser.content_types:
+        if re.search(pat, cleaned_prompt, re.I):
+            params["searchType"] = val
+            cleaned_prompt = remove_pattern(cleaned_prompt, pat)
+            break
+    for pat, val in PromptParser.date_ranges:
+        m = re.search(pat, cleaned_prompt, re.I)
+        if m:
+            params["dateRestrict"] = val.format(*m.groups())
+            cleaned_prompt = remove_pattern(cleaned_prompt, pat)
+            break
+    site_pat = r"\b(sito|site|site web|sitio)\s+([^\s]+)"
+    m = re.search(site_pat, cleaned_prompt, re.I)
+    if m:
+        params["siteSearch"] = m.group(2)
+        cleaned_prompt = remove_pattern(cleaned_prompt, site_pat)
+        if any(re.search(p, cleaned_prompt, re.I) for p in PromptParser.exclude):
+            params["siteSearchFilter"] = "i"
+            for p in PromptParser.exclude:
+                cleaned_prompt = remove_pattern(cleaned_prompt, p)
+        else:
+            params["siteSearchFilter"] = "e"
+    cleaned_prompt = re.sub(r"\s+", " ", cleaned_prompt).strip()
+    return params, cleaned_prompt
+
+
+def check_prompt_parser(prompts: List[str] = EXAMPLE_PROMPTS) -> List[str]:
+    return [
+        prompt
+        for prompt in prompts
+        for parse in (PromptParser.parse, parse_prompt)
+        if parse(prompt) != parse_prompt_sequential(prompt)
+    ]
+
+
+def benchmark_prompt_parser(rounds: int = 500) -> Dict[str, float]:
+    results = {}
+    for name, parse in (
+        ("sequential", parse_prompt_sequential),
+        ("compiled", PromptParser.parse),
+        ("memoized", parse_prompt),
+    ):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for prompt in EXAMPLE_PROMPTS:
+                parse(prompt)
+        results[name] = rounds * len(EXAMPLE_PROMPTS) / (time.perf_counter() - started)
+    return results
+
+
+def benchmark_service_client(rounds: int = 200) -> Dict[str, float]:
+    results = {}
+    warm = ServiceCache()
+    for name, get_cache in (("cold", ServiceCache), ("warm", lambda: warm)):
+        started = time.perf_counter()
+        for i in range(rounds):
+            service = get_cache().get("benchmark-key")
+            service.cse().list(q=f"query {i}", cx="benchmark-cx", num=10)
+        results[name] = (time.perf_counter() - started) / rounds * 1000
+    return results
+
+
+def main():
+    mismatches = check_prompt_parser()
+    print(
+        f"parser equivalence: {len(EXAMPLE_PROMPTS) - len(set(mismatches))}/"
+        f"{len(EXAMPLE_PROMPTS)} example prompts match the sequential parser"
+    )
+    for prompt in mismatches:
+        print(f"  mismatch: {prompt!r}")
+    for name, ms in benchmark_service_client().items():
+        print(f"{name} client: {ms:.3f} ms per query")
+    rates = benchmark_prompt_parser()
+    for name, rate in rates.items():
+        print(f"{name} parser: {rate:,.0f} prompts/sec")
+    print(f"speedup: {rates['compiled'] / rates['sequential']:.1f}x compiled")
+
+
+if __name__ == "__main__":
+    main()